@@ -0,0 +1,26 @@
+import os
+import tempfile
+from typing import Optional, Sequence
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def configure_environment(database_url: Optional[str] = None, hash_workers: Optional[int] = None, bcrypt_rounds: Optional[int] = None) -> str:
+    # Must run before anything under src/ is imported: the app reads its settings at import time
+    if database_url is None:
+        workdir = tempfile.mkdtemp(prefix="bench-")
+        database_url = f"sqlite:///{workdir}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("BETTER_AUTH_SECRET", "benchmark-secret")
+    # Every benchmark client logs in from one address, often as one user; throttling would measure 429s
+    for name in ("AUTH_IP_PER_MINUTE", "AUTH_IP_BURST", "AUTH_EMAIL_PER_MINUTE", "AUTH_EMAIL_BURST"):
+        os.environ.setdefault(name, "1000000")
+    if hash_workers is not None:
+        os.environ["HASH_WORKERS"] = str(hash_workers)
+    if bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    return database_url
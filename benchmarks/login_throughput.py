@@ -0,0 +1,84 @@
+"""Login throughput benchmark.
+
+Runs concurrent /api/login calls against the app in-process and reports
+logins per second, latency percentiles and /api/health latency measured
+during the burst. Compare the threadpool path with the process pool:
+
+    python -m benchmarks.login_throughput --workers 0
+    python -m benchmarks.login_throughput --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from .common import configure_environment, percentile
+
+async def run(requests: int, concurrency: int):
+    import httpx
+
+    from src.db import engine
+    from src.lib.security import shutdown_hash_executor
+    from src.main import app
+    from src.migrations import upgrade
+
+    upgrade(engine)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/signup", json={"email": "bench@example.com", "password": "benchpassword"})
+        login = {"username": "bench@example.com", "password": "benchpassword"}
+        # Warm up the worker processes so spawn cost is not measured
+        await asyncio.gather(*(client.post("/api/login", data=login) for _ in range(concurrency)))
+
+        latencies, health_latencies, statuses = [], [], {}
+        remaining = requests
+        done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.post("/api/login", data=login)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def health_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/api/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(health_probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+    shutdown_hash_executor()
+
+    print(f"hash workers:     {os.environ['HASH_WORKERS']}")
+    print(f"bcrypt rounds:    {os.environ.get('BCRYPT_ROUNDS', '12')}")
+    print(f"logins:           {requests} at concurrency {concurrency}")
+    print(f"status codes:     {statuses}")
+    print(f"throughput:       {requests / elapsed:.1f} logins/s")
+    print(f"login p50/p95:    {percentile(latencies, 50) * 1000:.1f} / {percentile(latencies, 95) * 1000:.1f} ms")
+    if health_latencies:
+        print(f"health p50/max:   {statistics.median(health_latencies) * 1000:.2f} / {max(health_latencies) * 1000:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="HASH_WORKERS; 0 uses the threadpool")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=None, help="BCRYPT_ROUNDS override")
+    args = parser.parse_args()
+
+    configure_environment(hash_workers=args.workers, bcrypt_rounds=args.rounds)
+    os.environ["HASH_QUEUE_SIZE"] = str(args.requests + args.concurrency)
+    asyncio.run(run(args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Task list serialization micro-benchmark.
+
+Encodes an in-memory list of Task rows the way FastAPI does for
+response_model=List[Task] (validate through pydantic, then stdlib json) and
+with the orjson path in src/lib/serialization.py, and checks both produce
+the same document:
+
+    python -m benchmarks.serialization --tasks 10000 --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import timedelta
+from typing import List
+
+from .common import configure_environment
+
+def run(count: int, repeat: int):
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    from src.lib.clock import utcnow
+    from src.lib.serialization import dump_tasks
+    from src.models.task import Task
+
+    now = utcnow()
+    tasks = [
+        Task(
+            id=i,
+            title=f"task {i}",
+            description=None if i % 3 else f"description for task {i}",
+            completed=bool(i % 2),
+            version=i,
+            updated_at=now - timedelta(seconds=i),
+            owner_id=1,
+        )
+        for i in range(1, count + 1)
+    ]
+    adapter = TypeAdapter(List[Task])
+
+    def response_model_path() -> bytes:
+        # What serialize_response + JSONResponse do for a declared response_model
+        validated = adapter.validate_python(tasks, from_attributes=True)
+        content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    if json.loads(response_model_path()) != json.loads(dump_tasks(tasks)):
+        raise SystemExit("serialized payloads differ")
+
+    results = {}
+    for name, encode in (("response_model", response_model_path), ("orjson", lambda: dump_tasks(tasks))):
+        encode()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encode()
+            timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+
+    print(f"tasks:            {count}, {repeat} runs each")
+    for name, median in results.items():
+        print(f"{name + ':':<18}{median * 1000:.2f} ms median")
+    print(f"speedup:          {results['response_model'] / results['orjson']:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    configure_environment()
+    run(args.tasks, args.repeat)
+
+if __name__ == "__main__":
+    main()
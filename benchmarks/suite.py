@@ -0,0 +1,461 @@
+"""API benchmark suite.
+
+Seeds a fresh database with N users x M tasks, then drives /api/signup,
+/api/login and every task route at a fixed concurrency, one route at a
+time. Each route reports throughput, p50/p95/p99 latency, unexpected
+status codes and DB queries per request. Requests are chosen
+deterministically from the request index, so two runs against the same
+arguments issue the same requests.
+
+    python -m benchmarks.suite run --output baseline.json
+    python -m benchmarks.suite run --transport http --output current.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.10
+
+"inprocess" calls the ASGI app directly through httpx; "http" serves it
+with uvicorn on a loopback port in a background thread, so the query
+counter still sees every statement. compare exits 1 when any route's p95
+latency rises, or its throughput falls, by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .common import configure_environment, percentile
+
+PASSWORD = "benchpassword"
+WORDS = ["alpha", "budget", "review", "deploy", "invoice", "meeting", "refactor", "release", "report", "sprint"]
+
+@dataclass
+class BenchUser:
+    id: int
+    email: str
+    token: str
+    task_ids: List[int] = field(default_factory=list)
+    disposable_ids: List[int] = field(default_factory=list)
+    etag: Optional[str] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+@dataclass
+class Context:
+    users: List[BenchUser]
+    run_id: str
+
+    def user(self, i: int) -> BenchUser:
+        return self.users[i % len(self.users)]
+
+    def task_id(self, i: int) -> int:
+        user = self.user(i)
+        return user.task_ids[(i // len(self.users)) % len(user.task_ids)]
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[Context, int], Request]
+    expect: Set[int] = field(default_factory=lambda: {200})
+    auth: bool = False
+    # Per-request rows consumed by destructive routes, seeded before the route runs
+    disposable: int = 0
+
+def _tasks_path(user: BenchUser, suffix: str = "") -> str:
+    return f"/api/users/{user.id}/tasks{suffix}"
+
+def _signup(ctx: Context, i: int) -> Request:
+    return "POST", "/api/signup", {"json": {"email": f"signup-{ctx.run_id}-{i}@bench.example", "password": PASSWORD}}
+
+def _login(ctx: Context, i: int) -> Request:
+    return "POST", "/api/login", {"data": {"username": ctx.user(i).email, "password": PASSWORD}}
+
+def _list(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user), {"params": {"limit": 50}, "headers": user.headers}
+
+def _list_not_modified(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user), {"params": {"limit": 50}, "headers": {**user.headers, "If-None-Match": user.etag or ""}}
+
+def _list_completed(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user), {"params": {"limit": 50, "completed": "true", "order": "desc"}, "headers": user.headers}
+
+def _search(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user, "/search"), {"params": {"q": WORDS[i % len(WORDS)], "limit": 20}, "headers": user.headers}
+
+def _get(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user, f"/{ctx.task_id(i)}"), {"headers": user.headers}
+
+def _changes(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user, "/changes"), {"params": {"since": 0, "limit": 100}, "headers": user.headers}
+
+def _export(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "GET", _tasks_path(user, "/export"), {"params": {"format": "ndjson" if i % 2 else "csv"}, "headers": user.headers}
+
+def _create(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "POST", _tasks_path(user), {"json": {"title": f"created {WORDS[i % len(WORDS)]} {i}"}, "headers": user.headers}
+
+def _update(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "PUT", _tasks_path(user, f"/{ctx.task_id(i)}"), {"json": {"title": f"updated {WORDS[i % len(WORDS)]} {i}"}, "headers": user.headers}
+
+def _toggle(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "PATCH", _tasks_path(user, f"/{ctx.task_id(i)}/complete"), {"headers": user.headers}
+
+def _batch_ids(ctx: Context, i: int, size: int = 10) -> List[int]:
+    return [ctx.task_id(i + n * len(ctx.users)) for n in range(size)]
+
+def _batch_create(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    items = [{"title": f"batch {WORDS[n % len(WORDS)]} {i}.{n}"} for n in range(10)]
+    return "POST", _tasks_path(user, ":batch/create"), {"json": {"items": items}, "headers": user.headers}
+
+def _batch_update(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    items = [{"id": task_id, "description": f"batch update {i}"} for task_id in _batch_ids(ctx, i)]
+    return "POST", _tasks_path(user, ":batch/update"), {"json": {"items": items}, "headers": user.headers}
+
+def _batch_complete(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "POST", _tasks_path(user, ":batch/complete"), {"json": {"ids": _batch_ids(ctx, i), "completed": bool(i % 2)}, "headers": user.headers}
+
+def _import(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    body = "".join(json.dumps({"title": f"imported {WORDS[n % len(WORDS)]} {i}.{n}"}) + "\n" for n in range(50))
+    return "POST", _tasks_path(user, "/import"), {"params": {"format": "ndjson"}, "content": body.encode(), "headers": user.headers}
+
+def _take_disposable(ctx: Context, i: int, count: int) -> Tuple[BenchUser, List[int]]:
+    user = ctx.user(i)
+    start = (i // len(ctx.users)) * count
+    return user, user.disposable_ids[start:start + count]
+
+def _delete(ctx: Context, i: int) -> Request:
+    user, (task_id,) = _take_disposable(ctx, i, 1)
+    return "DELETE", _tasks_path(user, f"/{task_id}"), {"headers": user.headers}
+
+def _batch_delete(ctx: Context, i: int) -> Request:
+    user, ids = _take_disposable(ctx, i, 10)
+    return "POST", _tasks_path(user, ":batch/delete"), {"json": {"ids": ids}, "headers": user.headers}
+
+def _clear_completed(ctx: Context, i: int) -> Request:
+    user = ctx.user(i)
+    return "POST", _tasks_path(user, ":batch/clear-completed"), {"headers": user.headers}
+
+# Reads run before writes so every read route sees the same seeded dataset
+SCENARIOS = [
+    Scenario("POST /api/signup", _signup, auth=True),
+    Scenario("POST /api/login", _login, auth=True),
+    Scenario("GET /tasks", _list),
+    Scenario("GET /tasks (If-None-Match)", _list_not_modified, expect={304}),
+    Scenario("GET /tasks?completed&order=desc", _list_completed),
+    Scenario("GET /tasks/search", _search),
+    Scenario("GET /tasks/{id}", _get),
+    Scenario("GET /tasks/changes", _changes),
+    Scenario("GET /tasks/export", _export),
+    Scenario("POST /tasks", _create),
+    Scenario("PUT /tasks/{id}", _update),
+    Scenario("PATCH /tasks/{id}/complete", _toggle),
+    Scenario("POST /tasks:batch/create", _batch_create),
+    Scenario("POST /tasks:batch/update", _batch_update),
+    Scenario("POST /tasks:batch/complete", _batch_complete),
+    Scenario("POST /tasks/import", _import),
+    Scenario("DELETE /tasks/{id}", _delete, expect={204}, disposable=1),
+    Scenario("POST /tasks:batch/delete", _batch_delete, disposable=10),
+    Scenario("POST /tasks:batch/clear-completed", _clear_completed),
+]
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        from sqlalchemy import event
+
+        from src.db import async_engine, engine
+
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def _insert_tasks(user_ids: List[int], per_user: int, label: str) -> Dict[int, List[int]]:
+    from sqlalchemy import insert, select
+
+    from src.db import engine
+    from src.lib.clock import utcnow
+    from src.models.task import Task
+    from src.models.task_revision import TaskRevision
+
+    now = utcnow()
+    rows = [
+        {
+            "title": f"{label} {WORDS[n % len(WORDS)]} {WORDS[(n * 7 + user_id) % len(WORDS)]} {n}",
+            "description": f"{WORDS[(n * 3) % len(WORDS)]} notes for {label} task {n}",
+            "completed": n % 3 == 0,
+            "owner_id": user_id,
+            "version": 1,
+            "updated_at": now,
+        }
+        for user_id in user_ids
+        for n in range(per_user)
+    ]
+    ids: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
+    with engine.begin() as connection:
+        if rows:
+            connection.execute(insert(Task), rows)
+        for task_id, owner_id in connection.execute(
+            select(Task.id, Task.owner_id).where(Task.owner_id.in_(user_ids), Task.title.startswith(label)).order_by(Task.id)
+        ):
+            ids[owner_id].append(task_id)
+        existing = set(connection.execute(select(TaskRevision.owner_id).where(TaskRevision.owner_id.in_(user_ids))).scalars())
+        missing = [{"owner_id": user_id, "revision": 1} for user_id in user_ids if user_id not in existing]
+        if missing:
+            connection.execute(insert(TaskRevision), missing)
+    return ids
+
+def seed(users: int, tasks: int, run_id: str) -> Context:
+    from sqlalchemy import insert, select
+
+    import src.main  # noqa: F401 -- registers every model before the mappers configure
+    from src.db import engine
+    from src.lib.jwt import create_access_token
+    from src.lib.security import get_password_hash
+    from src.migrations import upgrade
+    from src.models.user import User
+
+    upgrade(engine)
+    # One hash shared by every seeded user keeps seeding fast at any bcrypt cost
+    hashed = get_password_hash(PASSWORD)
+    emails = [f"user-{run_id}-{n}@bench.example" for n in range(users)]
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"email": email, "hashed_password": hashed} for email in emails])
+        user_ids = dict(connection.execute(select(User.email, User.id).where(User.email.in_(emails))).all())
+
+    bench_users = [
+        BenchUser(id=user_ids[email], email=email, token=create_access_token({"sub": str(user_ids[email])}))
+        for email in emails
+    ]
+    task_ids = _insert_tasks([user.id for user in bench_users], tasks, "seeded")
+    for user in bench_users:
+        user.task_ids = task_ids[user.id]
+    return Context(users=bench_users, run_id=run_id)
+
+async def prepare(client, ctx: Context, scenario: Scenario, requests: int):
+    if scenario.disposable:
+        per_user = -(-requests // len(ctx.users)) * scenario.disposable
+        ids = _insert_tasks([user.id for user in ctx.users], per_user, f"disposable-{len(ctx.users[0].disposable_ids)}")
+        for user in ctx.users:
+            user.disposable_ids.extend(ids[user.id])
+    if scenario.request is _list_not_modified:
+        for user in ctx.users:
+            response = await client.get(_tasks_path(user), params={"limit": 50}, headers=user.headers)
+            user.etag = response.headers.get("ETag")
+
+async def drive(client, ctx: Context, scenario: Scenario, requests: int, concurrency: int, counter: QueryCounter) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, path, kwargs = scenario.request(ctx, i)
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    await prepare(client, ctx, scenario, requests)
+    queries_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - started
+    queries = counter.count - queries_before
+
+    return {
+        "requests": requests,
+        "errors": sum(n for code, n in statuses.items() if code not in scenario.expect),
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries_per_request": round(queries / requests, 2),
+    }
+
+async def run_scenarios(client, ctx: Context, args, counter: QueryCounter) -> Dict[str, Any]:
+    results = {}
+    selected = [s for s in SCENARIOS if not args.route or any(part in s.name for part in args.route)]
+    for scenario in selected:
+        requests = args.auth_requests if scenario.auth else args.requests
+        results[scenario.name] = await drive(client, ctx, scenario, requests, args.concurrency, counter)
+        print(_format_row(scenario.name, results[scenario.name]), file=sys.stderr)
+    return results
+
+async def run_inprocess(ctx: Context, args, counter: QueryCounter) -> Dict[str, Any]:
+    import httpx
+
+    from src.db import async_engine
+    from src.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        results = await run_scenarios(client, ctx, args, counter)
+    await async_engine.dispose()
+    return results
+
+async def run_http(ctx: Context, args, counter: QueryCounter) -> Dict[str, Any]:
+    import httpx
+    import uvicorn
+
+    from src.main import app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        await asyncio.sleep(0.05)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            return await run_scenarios(client, ctx, args, counter)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+def _format_row(name: str, result: Dict[str, Any]) -> str:
+    return (
+        f"{name:<38} {result['throughput_rps']:>9.1f} req/s  "
+        f"p50 {result['p50_ms']:>8.2f}  p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  "
+        f"{result['queries_per_request']:>5.1f} q/req  errors {result['errors']}"
+    )
+
+def command_run(args) -> int:
+    configure_environment(args.database_url, args.hash_workers, args.bcrypt_rounds)
+    counter = QueryCounter()
+    counter.install()
+
+    run_id = args.run_id or str(int(time.time()))
+    report: Dict[str, Any] = {
+        "meta": {
+            "users": args.users,
+            "tasks_per_user": args.tasks,
+            "requests": args.requests,
+            "auth_requests": args.auth_requests,
+            "concurrency": args.concurrency,
+            "database": os.environ["DATABASE_URL"].split("://", 1)[0],
+            "bcrypt_rounds": int(os.environ.get("BCRYPT_ROUNDS", "12")),
+            "hash_workers": os.environ.get("HASH_WORKERS"),
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+    }
+    from src.lib.security import shutdown_hash_executor
+
+    try:
+        for transport in args.transport:
+            print(f"== {transport}", file=sys.stderr)
+            runner = run_http if transport == "http" else run_inprocess
+            # Each transport gets its own users so earlier writes cannot skew later reads
+            ctx = seed(args.users, args.tasks, f"{run_id}-{transport}")
+            report[transport] = asyncio.run(runner(ctx, args, counter))
+    finally:
+        shutdown_hash_executor()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    failed = [name for transport in args.transport for name, result in report[transport].items() if result["errors"]]
+    if failed:
+        print(f"routes with unexpected status codes: {', '.join(sorted(set(failed)))}", file=sys.stderr)
+        return 1
+    return 0
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for transport in ("inprocess", "http"):
+        for name, before in baseline.get(transport, {}).items():
+            after = current.get(transport, {}).get(name)
+            if after is None:
+                continue
+            if before["p95_ms"] > 0 and after["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{transport} {name}: p95 {before['p95_ms']:.2f} -> {after['p95_ms']:.2f} ms")
+            if after["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+                regressions.append(f"{transport} {name}: throughput {before['throughput_rps']:.1f} -> {after['throughput_rps']:.1f} req/s")
+            if after["queries_per_request"] > before["queries_per_request"] * (1 + threshold):
+                regressions.append(f"{transport} {name}: queries/request {before['queries_per_request']} -> {after['queries_per_request']}")
+    return regressions
+
+def command_compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for transport in ("inprocess", "http"):
+        for name, after in current.get(transport, {}).items():
+            before = baseline.get(transport, {}).get(name)
+            if before is not None:
+                change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+                print(f"{transport:<9} {name:<38} p95 {before['p95_ms']:>8.2f} -> {after['p95_ms']:>8.2f} ms ({change:+.1f}%)")
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="seed a database and benchmark every route")
+    run.add_argument("--users", type=int, default=10)
+    run.add_argument("--tasks", type=int, default=200, help="tasks per user")
+    run.add_argument("--requests", type=int, default=500, help="requests per task route")
+    run.add_argument("--auth-requests", type=int, default=50, help="requests for signup and login, which pay for bcrypt")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--transport", nargs="+", choices=["inprocess", "http"], default=["inprocess"])
+    run.add_argument("--route", nargs="*", help="only run routes whose name contains one of these strings")
+    run.add_argument("--database-url", default=None, help="defaults to a fresh SQLite file")
+    run.add_argument("--hash-workers", type=int, default=None)
+    run.add_argument("--bcrypt-rounds", type=int, default=None)
+    run.add_argument("--run-id", default=None, help="suffix for seeded emails")
+    run.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    run.set_defaults(handler=command_run)
+
+    diff = commands.add_parser("compare", help="compare two reports and fail on regressions")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=0.10, help="allowed relative change, e.g. 0.10 for 10%%")
+    diff.set_defaults(handler=command_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,139 @@
+import asyncio
 import os
-from typing import Generator
+from typing import Any, AsyncGenerator, Dict, Optional
 
-from sqlmodel import Session, SQLModel, create_engine
+from fastapi.requests import HTTPConnection
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .lib.replicas import RecentWriters, ReplicaSet
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Comma-separated; each replica may use a sync or async driver URL, like DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# After a write, the writer's reads stay on the primary this long so they see their own changes
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Pool settings for the request engines (primary and replicas), per worker process
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+# Recycling before the server or a proxy drops idle connections avoids failing on a dead socket
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Connections opened during startup; 0 disables pre-warming
+DB_POOL_PREWARM = int(os.environ.get("DB_POOL_PREWARM", str(DB_POOL_SIZE)))
+# Postgres only; 0 leaves the server default
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+_ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return url
+    parsed = make_url(url)
+    drivername = _ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    query = dict(parsed.query)
+    if drivername == "postgresql+asyncpg":
+        # asyncpg spells libpq's sslmode as ssl and rejects libpq-only options
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+    return parsed.set(drivername=drivername, query=query).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+def engine_options(url: Optional[str]) -> Dict[str, Any]:
+    parsed = make_url(url)
+    options: Dict[str, Any] = {"pool_pre_ping": DB_POOL_PRE_PING}
+    # In-memory SQLite gets a single shared connection, which takes no sizing options
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+    )
+    if DB_STATEMENT_TIMEOUT_MS > 0 and parsed.get_backend_name() == "postgresql":
+        if parsed.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+# The synchronous engine is only used for schema management, so it keeps the small default
+# pool and no statement timeout; requests go through async_engine
+engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
-engine = create_engine(DATABASE_URL, echo=True)
+replicas = ReplicaSet([create_async_engine(to_async_url(url), **engine_options(to_async_url(url))) for url in DATABASE_REPLICA_URLS])
+recent_writers = RecentWriters(READ_YOUR_WRITES_SECONDS)
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
 
-def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+def _request_user_id(request: HTTPConnection) -> Optional[int]:
+    try:
+        return int(request.path_params["user_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _request_method(request: HTTPConnection) -> str:
+    # WebSocket handshakes have no method; they only ever read
+    return request.scope.get("method", "GET")
+
+async def get_session(request: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    user_id = _request_user_id(request)
+    writing = user_id is not None and _request_method(request) not in _SAFE_METHODS
+    # Marked before the write and again after it, so the window covers the commit
+    if writing:
+        recent_writers.mark(user_id)
+    async with async_session_maker() as session:
         yield session
+    if writing:
+        recent_writers.mark(user_id)
+
+async def get_read_session(request: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    # Only plain reads go to a replica; anything in a write request reads from the primary
+    engine = None
+    user_id = _request_user_id(request)
+    if _request_method(request) in _SAFE_METHODS and not (user_id is not None and recent_writers.is_recent(user_id)):
+        engine = replicas.pick()
+    if engine is None:
+        async with async_session_maker() as session:
+            yield session
+        return
+    async with async_session_maker(bind=engine) as session:
+        try:
+            yield session
+        except (OperationalError, InterfaceError):
+            replicas.mark_down(engine)
+            raise
+
+def is_primary_session(session: AsyncSession) -> bool:
+    return session.bind is async_engine
+
+def dialect_insert(session: AsyncSession, model):
+    # ON CONFLICT upserts need the dialect-specific insert construct
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+async def prewarm_pool(engine: AsyncEngine, connections: int) -> int:
+    # Holding them all at once makes the pool open that many distinct connections
+    pending = [engine.connect() for _ in range(connections)]
+    results = await asyncio.gather(*(connection.start() for connection in pending), return_exceptions=True)
+    opened = [connection for connection, result in zip(pending, results) if not isinstance(result, BaseException)]
+    await asyncio.gather(*(connection.close() for connection in opened))
+    return len(opened)
+
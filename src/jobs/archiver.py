@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from itertools import groupby
+
+from sqlalchemy import literal
+from sqlmodel import delete, insert, select, update
+
+from ..db import async_session_maker
+from ..lib.clock import utcnow
+from ..models.archived_task import ARCHIVE_COLUMNS, ArchivedTask
+from ..models.task import Task
+from ..models.task_revision import TaskRevision
+
+logger = logging.getLogger(__name__)
+
+# Completed tasks untouched for this long leave the task table; 0 disables archiving
+TASK_ARCHIVE_AFTER_DAYS = int(os.environ.get("TASK_ARCHIVE_AFTER_DAYS", "30"))
+TASK_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("TASK_ARCHIVE_INTERVAL_SECONDS", "3600"))
+TASK_ARCHIVE_CHUNK_SIZE = int(os.environ.get("TASK_ARCHIVE_CHUNK_SIZE", "1000"))
+
+async def archive_owner_tasks(owner_id: int, cutoff, chunk_size: int = TASK_ARCHIVE_CHUNK_SIZE) -> int:
+    async with async_session_maker() as session:
+        # Bumping the revision takes the owner's row lock, which orders the move with TaskService
+        # writes, and changes the list ETag, since the default list no longer shows these tasks
+        await session.exec(update(TaskRevision).where(TaskRevision.owner_id == owner_id).values(revision=TaskRevision.revision + 1))
+        # Re-checked under the lock: a task may have been reopened since it was picked
+        ids = (await session.exec(
+            select(Task.id)
+            .where(Task.owner_id == owner_id, Task.completed == True, Task.deleted == False, Task.updated_at < cutoff)
+            .limit(chunk_size)
+        )).all()
+        if not ids:
+            await session.rollback()
+            return 0
+        await session.exec(insert(ArchivedTask).from_select(
+            ARCHIVE_COLUMNS + ["archived_at"],
+            select(*[getattr(Task, column) for column in ARCHIVE_COLUMNS], literal(utcnow(), type_=ArchivedTask.__table__.c.archived_at.type))
+            .where(Task.id.in_(ids)),
+        ))
+        await session.exec(delete(Task).where(Task.id.in_(ids)))
+        await session.commit()
+        return len(ids)
+
+async def archive_completed_tasks(age: timedelta = timedelta(days=TASK_ARCHIVE_AFTER_DAYS), chunk_size: int = TASK_ARCHIVE_CHUNK_SIZE) -> int:
+    cutoff = utcnow() - age
+    archived = 0
+    while True:
+        async with async_session_maker() as session:
+            candidates = (await session.exec(
+                select(Task.owner_id, Task.id)
+                .where(Task.completed == True, Task.deleted == False, Task.updated_at < cutoff)
+                .limit(chunk_size)
+            )).all()
+        moved = 0
+        # One short transaction per owner; holding several owners' locks at once could deadlock
+        for owner_id, rows in groupby(sorted(candidates, key=lambda row: row[0] or 0), key=lambda row: row[0]):
+            moved += await archive_owner_tasks(owner_id, cutoff, len(list(rows)))
+        if not moved:
+            return archived
+        archived += moved
+
+async def run_archiver(interval: int = TASK_ARCHIVE_INTERVAL_SECONDS):
+    while True:
+        try:
+            archived = await archive_completed_tasks()
+            if archived:
+                logger.info("Archived %d completed tasks", archived)
+        except Exception:
+            logger.exception("Task archiving failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+from typing import Set
+
+from sqlalchemy import func
+from sqlmodel import select, update
+
+from ..db import async_session_maker
+from ..lib.clock import utcnow
+from ..lib.events import task_events
+from ..lib.ordering import keys_after
+from ..models.archived_task import ArchivedTask
+from ..models.task import Task
+from ..models.task_revision import TaskRevision
+
+logger = logging.getLogger(__name__)
+
+# Repeated moves into the same gap add roughly one character per six moves; past this length a
+# move queues the owner for a rebalance that rewrites their keys short and evenly spaced
+TASK_POSITION_MAX_LENGTH = int(os.environ.get("TASK_POSITION_MAX_LENGTH", "32"))
+TASK_REBALANCE_INTERVAL_SECONDS = int(os.environ.get("TASK_REBALANCE_INTERVAL_SECONDS", "60"))
+
+# Owners queued by this worker's moves; losing the set on restart only delays a rebalance
+_pending: Set[int] = set()
+
+def request_rebalance(owner_id: int):
+    _pending.add(owner_id)
+
+async def rebalance_owner_positions(owner_id: int, max_length: int = TASK_POSITION_MAX_LENGTH) -> int:
+    async with async_session_maker() as session:
+        # The owner's row lock orders the rewrite with TaskService writes; the new revision makes
+        # delta sync and the list ETag pick up the rewritten keys
+        revision = (await session.exec(
+            update(TaskRevision)
+            .where(TaskRevision.owner_id == owner_id)
+            .values(revision=TaskRevision.revision + 1)
+            .returning(TaskRevision.revision)
+        )).scalar_one_or_none()
+        longest = 0
+        for model in (Task, ArchivedTask):
+            length = (await session.exec(
+                select(func.max(func.length(model.position))).where(model.owner_id == owner_id, model.deleted == False)
+            )).one()
+            longest = max(longest, length or 0)
+        # Re-checked under the lock: another worker may have rebalanced already
+        if revision is None or longest <= max_length:
+            await session.rollback()
+            return 0
+
+        # Archived tasks keep their place in the sequence, so a restored task lands where it was
+        rows = []
+        for model in (Task, ArchivedTask):
+            rows.extend(
+                (position or "", task_id, model)
+                for task_id, position in (await session.exec(
+                    select(model.id, model.position).where(model.owner_id == owner_id, model.deleted == False)
+                )).all()
+            )
+        rows.sort(key=lambda row: row[:2])
+        updates = {Task: [], ArchivedTask: []}
+        now = utcnow()
+        for (_, task_id, model), position in zip(rows, keys_after(None, len(rows))):
+            row = {"id": task_id, "position": position}
+            if model is Task:
+                row.update(version=revision, updated_at=now)
+            updates[model].append(row)
+        for model, params in updates.items():
+            # Bulk UPDATE by primary key, one executemany per table
+            if params:
+                await session.exec(update(model), params=params)
+        tasks = (await session.exec(select(Task).where(Task.owner_id == owner_id, Task.version == revision))).all()
+        await session.commit()
+        await task_events.publish(owner_id, revision, tasks)
+        return len(rows)
+
+async def rebalance_pending_positions() -> int:
+    rebalanced = 0
+    while _pending:
+        owner_id = _pending.pop()
+        # One short transaction per owner
+        if await rebalance_owner_positions(owner_id):
+            rebalanced += 1
+    return rebalanced
+
+async def run_position_rebalancer(interval: int = TASK_REBALANCE_INTERVAL_SECONDS):
+    while True:
+        try:
+            rebalanced = await rebalance_pending_positions()
+            if rebalanced:
+                logger.info("Rebalanced task positions for %d user(s)", rebalanced)
+        except Exception:
+            logger.exception("Task position rebalancing failed")
+        await asyncio.sleep(interval)
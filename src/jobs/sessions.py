@@ -0,0 +1,31 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import or_
+from sqlmodel import delete
+
+from ..db import async_session_maker
+from ..lib.clock import utcnow
+from ..models.refresh_token import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_PURGE_INTERVAL_SECONDS = int(os.environ.get("REFRESH_TOKEN_PURGE_INTERVAL_SECONDS", "3600"))
+
+async def purge_refresh_tokens() -> int:
+    # Used tokens are kept until expiry so a replay is still recognized and revokes its family
+    async with async_session_maker() as session:
+        result = await session.exec(delete(RefreshToken).where(or_(RefreshToken.expires_at < utcnow(), RefreshToken.revoked == True)))
+        await session.commit()
+        return result.rowcount
+
+async def run_refresh_token_purger(interval: int = REFRESH_TOKEN_PURGE_INTERVAL_SECONDS):
+    while True:
+        try:
+            purged = await purge_refresh_tokens()
+            if purged:
+                logger.info("Purged %d expired or revoked refresh tokens", purged)
+        except Exception:
+            logger.exception("Refresh token purge failed")
+        await asyncio.sleep(interval)
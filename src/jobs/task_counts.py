@@ -0,0 +1,98 @@
+"""Rebuild the materialized task counters from the task table.
+
+    python -m src.jobs.task_counts [--user USER_ID]
+
+TaskService keeps the counters current on every write; this recounts
+them when they are suspected to have drifted (manual SQL, a restore, a
+bug) and prunes day buckets that have left the recent window.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import case, func
+from sqlmodel import delete, select
+
+from ..db import async_session_maker, dialect_insert
+from ..lib.clock import utcnow
+from ..models.archived_task import ArchivedTask
+from ..models.task import Task
+from ..models.task_revision import TaskRevision
+from ..models.task_stats import TaskCounts, TaskDailyCount, recent_since
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Day buckets only leave the stats window once a day, so this need not run often
+TASK_COUNTS_PRUNE_INTERVAL_SECONDS = int(os.environ.get("TASK_COUNTS_PRUNE_INTERVAL_SECONDS", "3600"))
+
+async def rebuild_owner_counts(owner_id: int):
+    since = recent_since(utcnow().date())
+    async with async_session_maker() as session:
+        # Writes take this row first, so holding it keeps the recount consistent with concurrent writes
+        await session.exec(select(TaskRevision.owner_id).where(TaskRevision.owner_id == owner_id).with_for_update())
+        total, completed, created = 0, 0, Counter()
+        # Archived tasks still belong to the user, so they count like live ones
+        for model in (Task, ArchivedTask):
+            live = (model.owner_id == owner_id, model.deleted == False)
+            model_total, model_completed = (await session.exec(
+                select(func.count(), func.coalesce(func.sum(case((model.completed == True, 1), else_=0)), 0)).where(*live)
+            )).one()
+            total, completed = total + model_total, completed + model_completed
+            created.update(
+                created_at.date()
+                for created_at in (await session.exec(select(model.created_at).where(*live, model.created_at >= since))).all()
+            )
+        await session.exec(
+            dialect_insert(session, TaskCounts)
+            .values(owner_id=owner_id, total=total, completed=completed)
+            .on_conflict_do_update(index_elements=[TaskCounts.owner_id], set_={"total": total, "completed": completed})
+        )
+        await session.exec(delete(TaskDailyCount).where(TaskDailyCount.owner_id == owner_id))
+        for day, count in created.items():
+            session.add(TaskDailyCount(owner_id=owner_id, day=day, created=count))
+        await session.commit()
+
+async def prune_daily_counts() -> int:
+    async with async_session_maker() as session:
+        result = await session.exec(delete(TaskDailyCount).where(TaskDailyCount.day < recent_since(utcnow().date())))
+        await session.commit()
+        return result.rowcount
+
+async def run_daily_count_pruner(interval: int = TASK_COUNTS_PRUNE_INTERVAL_SECONDS):
+    while True:
+        try:
+            pruned = await prune_daily_counts()
+            if pruned:
+                logger.info("Pruned %d daily task count buckets", pruned)
+        except Exception:
+            logger.exception("Daily task count pruning failed")
+        await asyncio.sleep(interval)
+
+async def rebuild_task_counts(owner_id: Optional[int] = None) -> int:
+    if owner_id is not None:
+        owners = [owner_id]
+    else:
+        async with async_session_maker() as session:
+            owners = (await session.exec(select(User.id).order_by(User.id))).all()
+    # One transaction per owner keeps each lock short
+    for owner in owners:
+        await rebuild_owner_counts(owner)
+    await prune_daily_counts()
+    return len(owners)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m src.jobs.task_counts", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", type=int, default=None, help="rebuild one user's counters only")
+    args = parser.parse_args()
+    rebuilt = asyncio.run(rebuild_task_counts(args.user))
+    print(f"rebuilt task counters for {rebuilt} user(s)")
+
+if __name__ == "__main__":
+    main()
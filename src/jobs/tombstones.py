@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from itertools import groupby
+from typing import List
+
+from sqlalchemy import case
+from sqlmodel import delete, select, update
+
+from ..db import async_session_maker
+from ..lib.clock import utcnow
+from ..models.task import Task
+from ..models.task_revision import TaskRevision
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_COMPACT_INTERVAL_SECONDS = int(os.environ.get("TOMBSTONE_COMPACT_INTERVAL_SECONDS", "3600"))
+TOMBSTONE_COMPACT_CHUNK_SIZE = int(os.environ.get("TOMBSTONE_COMPACT_CHUNK_SIZE", "1000"))
+
+async def compact_owner_tombstones(owner_id: int, task_ids: List[int], version: int) -> int:
+    async with async_session_maker() as session:
+        # Raise the owner's watermark first so a client holding an older cursor is told to resync
+        await session.exec(
+            update(TaskRevision)
+            .where(TaskRevision.owner_id == owner_id)
+            .values(compacted_version=case((TaskRevision.compacted_version < version, version), else_=TaskRevision.compacted_version))
+        )
+        await session.exec(delete(Task).where(Task.id.in_(task_ids)))
+        await session.commit()
+    return len(task_ids)
+
+async def compact_tombstones(retention: timedelta = timedelta(days=TOMBSTONE_RETENTION_DAYS), chunk_size: int = TOMBSTONE_COMPACT_CHUNK_SIZE) -> int:
+    cutoff = utcnow() - retention
+    purged = 0
+    while True:
+        async with async_session_maker() as session:
+            rows = (await session.exec(
+                select(Task.owner_id, Task.id, Task.version)
+                .where(Task.deleted == True, Task.updated_at < cutoff)
+                .limit(chunk_size)
+            )).all()
+        if not rows:
+            return purged
+        # One short transaction per owner; holding several owners' locks at once could deadlock
+        for owner_id, owner_rows in groupby(sorted(rows, key=lambda row: row[0] or 0), key=lambda row: row[0]):
+            owner_rows = list(owner_rows)
+            purged += await compact_owner_tombstones(
+                owner_id, [task_id for _, task_id, _ in owner_rows], max(version for _, _, version in owner_rows)
+            )
+
+async def run_tombstone_compactor(interval: int = TOMBSTONE_COMPACT_INTERVAL_SECONDS):
+    while True:
+        try:
+            purged = await compact_tombstones()
+            if purged:
+                logger.info("Compacted %d task tombstones", purged)
+        except Exception:
+            logger.exception("Tombstone compaction failed")
+        await asyncio.sleep(interval)
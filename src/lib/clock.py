@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+
+# Timestamp columns are TIMESTAMP WITHOUT TIME ZONE, so everything stored is naive UTC; asyncpg
+# rejects aware values for them
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def naive_utc(value: datetime) -> datetime:
+    # Client-supplied times may carry any offset; naive ones are taken as UTC
+    return value if value.tzinfo is None else value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def as_utc(value: datetime) -> datetime:
+    # Naive values (as stored) are UTC already
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
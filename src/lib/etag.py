@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+TASK_LIST_CACHE_SIZE = int(os.environ.get("TASK_LIST_CACHE_SIZE", "1024"))
+# Entries are whole response bodies, so the cache is bounded by their total size as well as their number;
+# a single body above the entry limit is never cached
+TASK_LIST_CACHE_MAX_BYTES = int(os.environ.get("TASK_LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TASK_LIST_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("TASK_LIST_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+
+def revision_etag(revision: int, epoch: int = 0) -> str:
+    return f'W/"{epoch:x}-{revision}"' if epoch else f'W/"{revision}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match always uses weak comparison
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+class RevisionCache:
+    """Small LRU for response bodies keyed by (owner, revision, ...),
+    bounded by entry count and by the bytes the callers report.
+
+    Keys include the owner's revision, so writes never need to invalidate
+    anything: stale entries simply stop being requested and age out.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = TASK_LIST_CACHE_SIZE,
+        max_bytes: int = TASK_LIST_CACHE_MAX_BYTES,
+        max_entry_bytes: int = TASK_LIST_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, size: int):
+        if self.maxsize <= 0 or size > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+task_list_cache = RevisionCache()
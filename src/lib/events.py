@@ -0,0 +1,278 @@
+import asyncio
+import importlib
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..models.task import Task
+from .serialization import dump_json, task_row
+
+logger = logging.getLogger(__name__)
+
+# "local" fans out inside this process only; "postgres" uses LISTEN/NOTIFY so every worker
+# sees every write; anything else is imported as "module:attribute" and called with the engine.
+# Unset, Postgres deployments get "postgres": several workers share the database, and the reminder
+# leader must see every worker's writes
+TASK_EVENTS_BACKEND = os.environ.get("TASK_EVENTS_BACKEND")
+# Events buffered per open stream before it counts as a slow consumer and is dropped
+TASK_EVENTS_QUEUE_SIZE = int(os.environ.get("TASK_EVENTS_QUEUE_SIZE", "64"))
+# Idle streams get a heartbeat this often, so proxies keep them open and dead peers are noticed
+TASK_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("TASK_EVENTS_HEARTBEAT_SECONDS", "15"))
+TASK_EVENTS_RECONNECT_SECONDS = float(os.environ.get("TASK_EVENTS_RECONNECT_SECONDS", "5"))
+
+# Sent when a subscriber may have missed events; the client catches up with /tasks/changes
+STALE = b'{"type":"stale"}'
+READY = b'{"type":"ready"}'
+PING = b'{"type":"ping"}'
+
+# Called with every event this worker receives, and with (None, STALE) when events may have been lost
+Listener = Callable[[Optional[int], bytes], None]
+
+class Subscription:
+    """One open stream's bounded queue of encoded events."""
+
+    def __init__(self, user_id: int, maxsize: int = TASK_EVENTS_QUEUE_SIZE):
+        self.user_id = user_id
+        self.dropped = False
+        self._queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize)
+        self._queue.put_nowait(READY)
+
+    def offer(self, message: bytes) -> bool:
+        if self.dropped:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.drop()
+            return False
+
+    def drop(self):
+        # A slow consumer's backlog is replaced by a single stale notice, after which the stream ends;
+        # blocking the publisher or growing the queue would let one tab hold up or exhaust the worker
+        self.dropped = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(STALE)
+
+    async def messages(self, heartbeat: float = TASK_EVENTS_HEARTBEAT_SECONDS) -> AsyncIterator[Optional[bytes]]:
+        # Yields None when a heartbeat is due
+        while True:
+            try:
+                message = await asyncio.wait_for(self._queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield message
+            if self.dropped and self._queue.empty():
+                return
+
+class EventBackend(ABC):
+    """Carries encoded events to every worker's TaskEventBus.
+
+    publish() sends an event; the backend hands each event it receives,
+    including this worker's own, to bus.deliver(). max_message_size is the
+    largest message the transport accepts, or None for no limit.
+    cross_worker is False for a backend that only delivers within the
+    publishing worker.
+    """
+
+    max_message_size: Optional[int] = None
+    cross_worker = True
+    bus: "TaskEventBus"
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: int, message: bytes):
+        ...
+
+    async def stop(self):
+        pass
+
+class LocalBackend(EventBackend):
+    cross_worker = False
+
+    async def publish(self, user_id: int, message: bytes):
+        self.bus.deliver(user_id, message)
+
+class PostgresNotifyBackend(EventBackend):
+    """Fan-out across workers with LISTEN/NOTIFY on one dedicated connection."""
+
+    CHANNEL = "task_events"
+    # NOTIFY rejects payloads of 8000 bytes or more; the user id prefix takes the rest
+    max_message_size = 7900
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._connection = None
+        self._driver = None
+        self._lock = asyncio.Lock()
+        self._lost = asyncio.Event()
+        self._supervisor: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._listen()
+        self._supervisor = asyncio.create_task(self._reconnect_when_lost())
+
+    async def publish(self, user_id: int, message: bytes):
+        async with self._lock:
+            if self._driver is None:
+                raise ConnectionError("Task event listener is not connected")
+            await self._driver.execute("SELECT pg_notify($1, $2)", self.CHANNEL, f"{user_id}:{message.decode()}")
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+        await self._close()
+
+    async def _listen(self):
+        self._lost.clear()
+        self._connection = await self.engine.connect()
+        raw = await self._connection.get_raw_connection()
+        self._driver = raw.driver_connection
+        self._driver.add_termination_listener(lambda connection: self._lost.set())
+        await self._driver.add_listener(self.CHANNEL, self._on_notify)
+
+    async def _reconnect_when_lost(self):
+        while True:
+            await self._lost.wait()
+            logger.warning("Task event listener disconnected; reconnecting")
+            await self._close()
+            while True:
+                try:
+                    await self._listen()
+                    break
+                except Exception:
+                    logger.exception("Task event listener reconnect failed")
+                    await asyncio.sleep(TASK_EVENTS_RECONNECT_SECONDS)
+            # Notifications sent while disconnected are gone
+            self.bus.resync_all()
+
+    async def _close(self):
+        async with self._lock:
+            connection, self._connection, self._driver = self._connection, None, None
+        if connection is not None:
+            try:
+                await connection.invalidate()
+                await connection.close()
+            except Exception:
+                logger.debug("Closing the task event listener failed", exc_info=True)
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        user_id, _, message = payload.partition(":")
+        self.bus.deliver(int(user_id), message.encode())
+
+def load_backend(name: Optional[str], engine: AsyncEngine) -> EventBackend:
+    if name is None:
+        name = "postgres" if engine.dialect.name == "postgresql" else "local"
+    if name == "local":
+        return LocalBackend()
+    if name == "postgres":
+        return PostgresNotifyBackend(engine)
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)(engine)
+
+class TaskEventBus:
+    """Per-user pub/sub for task changes.
+
+    TaskService publishes after each committed write; open streams
+    subscribe per user. Events carry the same rows as /tasks/changes, so a
+    client applies them exactly like a delta sync page.
+    """
+
+    def __init__(self, backend: Optional[EventBackend] = None, queue_size: int = TASK_EVENTS_QUEUE_SIZE):
+        self.backend = backend or LocalBackend()
+        self.backend.bus = self
+        self.queue_size = queue_size
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._listeners: List[Listener] = []
+
+    async def start(self, backend: Optional[EventBackend] = None):
+        if backend is not None:
+            backend.bus = self
+            self.backend = backend
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+        self.resync_all()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    async def publish(self, user_id: int, version: int, tasks: Iterable[Task]):
+        message = dump_json({"type": "changes", "version": version, "changes": [task_row(task) for task in tasks]})
+        limit = self.backend.max_message_size
+        if limit is not None and len(message) > limit:
+            message = dump_json({"type": "stale", "version": version})
+        self.published += 1
+        try:
+            await self.backend.publish(user_id, message)
+        except Exception:
+            # The write is already committed; subscribers recover through /tasks/changes
+            self.failed += 1
+            logger.exception("Publishing a task event failed")
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def deliver(self, user_id: int, message: bytes):
+        for listener in self._listeners:
+            try:
+                listener(user_id, message)
+            except Exception:
+                logger.exception("Task event listener failed")
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if subscription.offer(message):
+                self.delivered += 1
+            elif subscription.dropped:
+                self.dropped += 1
+                self.unsubscribe(subscription)
+
+    def resync_all(self):
+        for listener in self._listeners:
+            try:
+                listener(None, STALE)
+            except Exception:
+                logger.exception("Task event listener failed")
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.drop()
+                self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+task_events = TaskEventBus()
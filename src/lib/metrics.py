@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .events import task_events
+from .principal_cache import principal_cache
+from .rate_limit import auth_throttle
+from .reminders import task_reminders
+
+# Bearer token for the /api/metrics endpoints, which expose routes, query text and pool state;
+# unset, the endpoints are not served at all
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """In-process counters and histograms rendered in Prometheus text format.
+
+    Series are keyed by route template rather than raw path, so label
+    cardinality stays bounded by the number of routes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._bucket_config: Dict[str, Sequence[float]] = {}
+
+    def counter(self, name: str, help: str):
+        self._help[name] = ("counter", help)
+        self._counters[name] = {}
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._help[name] = ("histogram", help)
+        self._histograms[name] = {}
+        self._bucket_config[name] = buckets
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1):
+        with self._lock:
+            series = self._counters[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = ()):
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self._bucket_config[name])
+            histogram.observe(value)
+
+    def counter_value(self, name: str, labels: Labels = ()) -> float:
+        with self._lock:
+            return self._counters[name].get(labels, 0)
+
+    def render(self, extra: Iterable[Tuple[str, str, str, Labels, float]] = ()) -> str:
+        # extra carries (name, type, help, labels, value) samples read from elsewhere at scrape time
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help) in self._help.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for labels, value in self._counters[name].items():
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for labels, histogram in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        seen = set()
+        for name, kind, help, labels, value in extra:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+registry = MetricsRegistry()
+registry.counter("http_requests_total", "HTTP requests by route template and status code.")
+registry.histogram("http_request_duration_seconds", "HTTP request latency, including streamed bodies.")
+registry.histogram("http_request_db_statements", "SQL statements executed per HTTP request.", STATEMENT_BUCKETS)
+registry.histogram("http_request_db_duration_seconds", "Time spent executing SQL per HTTP request.")
+registry.counter("db_statements_total", "SQL statements executed, inside or outside a request.")
+registry.counter("db_statement_duration_seconds_total", "Total time spent executing SQL.")
+registry.counter("db_pool_checkouts_total", "Connections checked out of the pool.")
+registry.counter("db_pool_connects_total", "New database connections the pool opened.")
+registry.counter("db_pool_exhausted_seconds_total", "Time every connection the pool may open was checked out, so checkouts waited.")
+
+class _RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+_request_stats: ContextVar[Optional[_RequestStats]] = ContextVar("request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    _record_statement(time.perf_counter() - starts.pop())
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("metrics_query_start") if exception_context.connection else None
+    if starts:
+        _record_statement(time.perf_counter() - starts.pop())
+
+def _record_statement(elapsed: float):
+    registry.inc("db_statements_total")
+    registry.inc("db_statement_duration_seconds_total", value=elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+class _PoolMonitor:
+    """Follows one engine's pool through its public events.
+
+    A checkout only waits while every connection the pool may open is
+    checked out, so the time spent in that state bounds checkout wait.
+    """
+
+    def __init__(self, engine: Engine, name: str, max_overflow: int):
+        self.engine = engine
+        self.labels: Labels = (("pool", name),)
+        self.max_overflow = max_overflow
+        self._exhausted_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def on_connect(self, dbapi_connection, connection_record):
+        registry.inc("db_pool_connects_total", self.labels)
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        registry.inc("db_pool_checkouts_total", self.labels)
+        pool = self.engine.pool
+        # A negative max_overflow means no limit, so the pool is never exhausted
+        if self.max_overflow < 0 or not hasattr(pool, "checkedout"):
+            return
+        if pool.checkedout() >= pool.size() + self.max_overflow:
+            with self._lock:
+                if self._exhausted_since is None:
+                    self._exhausted_since = time.perf_counter()
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            since, self._exhausted_since = self._exhausted_since, None
+        if since is not None:
+            registry.inc("db_pool_exhausted_seconds_total", self.labels, time.perf_counter() - since)
+
+_pool_monitors: Dict[str, _PoolMonitor] = {}
+
+def instrument_engine(engine: Engine, name: str, max_overflow: int = 10):
+    # max_overflow is what the engine was created with; 10 is SQLAlchemy's default
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    # Pool listeners registered on the engine carry over to the new pool dispose() creates
+    monitor = _PoolMonitor(engine, name, max_overflow)
+    event.listen(engine, "connect", monitor.on_connect)
+    event.listen(engine, "checkout", monitor.on_checkout)
+    event.listen(engine, "checkin", monitor.on_checkin)
+    _pool_monitors[name] = monitor
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for name, monitor in _pool_monitors.items():
+        pool = monitor.engine.pool
+        entry: Dict[str, Any] = {"class": type(pool).__name__}
+        # Only queue pools track sizes; single-connection pools report counts alone
+        if hasattr(pool, "checkedout"):
+            entry.update(
+                size=pool.size(),
+                max_overflow=monitor.max_overflow,
+                in_use=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        entry["checkouts"] = registry.counter_value("db_pool_checkouts_total", monitor.labels)
+        entry["connects"] = registry.counter_value("db_pool_connects_total", monitor.labels)
+        entry["exhausted_seconds_total"] = round(registry.counter_value("db_pool_exhausted_seconds_total", monitor.labels), 6)
+        stats[name] = entry
+    return stats
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    return route.path_format if route is not None else "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to their last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            labels = (("method", scope["method"]), ("route", _route_template(scope)))
+            registry.inc("http_requests_total", labels + (("status", str(status_code)),))
+            registry.observe("http_request_duration_seconds", elapsed, labels)
+            registry.observe("http_request_db_statements", stats.statements, labels)
+            registry.observe("http_request_db_duration_seconds", stats.db_seconds, labels)
+
+_POOL_GAUGES = {
+    "size": "db_pool_size",
+    "in_use": "db_pool_connections_in_use",
+    "idle": "db_pool_connections_idle",
+    "overflow": "db_pool_overflow",
+}
+
+def render_metrics() -> str:
+    cache = principal_cache.stats()
+    extra = [
+        ("principal_cache_entries", "gauge", "Bearer tokens currently cached.", (), cache["size"]),
+        ("principal_cache_hits_total", "counter", "Principal cache hits.", (), cache["hits"]),
+        ("principal_cache_misses_total", "counter", "Principal cache misses.", (), cache["misses"]),
+        ("auth_throttled_total", "counter", "Login and signup attempts rejected with 429.", (), auth_throttle.rejected),
+    ]
+    events = task_events.stats()
+    extra += [
+        ("task_event_subscribers", "gauge", "Open task event streams in this worker.", (), events["subscribers"]),
+        ("task_events_published_total", "counter", "Task events published by this worker.", (), events["published"]),
+        ("task_events_delivered_total", "counter", "Task events queued to a stream.", (), events["delivered"]),
+        ("task_event_subscribers_dropped_total", "counter", "Streams dropped as slow consumers.", (), events["dropped"]),
+        ("task_events_failed_total", "counter", "Task events the backend failed to publish.", (), events["failed"]),
+    ]
+    reminders = task_reminders.stats()
+    extra += [
+        ("task_reminder_leader", "gauge", "1 when this worker schedules reminders.", (), reminders["leader"]),
+        ("task_reminders_scheduled", "gauge", "Reminders held in the scheduler's heap.", (), reminders["scheduled"]),
+        ("task_reminders_fired_total", "counter", "Reminders delivered by this worker.", (), reminders["fired"]),
+        ("task_reminders_failed_total", "counter", "Reminder notifications that raised.", (), reminders["failed"]),
+    ]
+    pools = pool_stats()
+    for key, metric in _POOL_GAUGES.items():
+        for name, entry in pools.items():
+            if key in entry:
+                extra.append((metric, "gauge", f"Connection pool {key.replace('_', ' ')}.", (("pool", name),), entry[key]))
+    return registry.render(extra)
@@ -0,0 +1,134 @@
+from typing import List, Optional
+
+# Fractional index keys: an integer part whose first character encodes its length ("a0", "a1",
+# ..., "az", "b00", ...; "Zz", "Zy", ... below "a0") followed by an optional base-62 fraction.
+# Keys compare correctly as plain byte strings, so there is always room for another key between
+# two neighbours and moving a task rewrites only that task. Appending increments the integer
+# part, which grows by one character per 62x more keys; only repeated inserts into the same gap
+# lengthen the fraction.
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+ZERO = DIGITS[0]
+SMALLEST_INTEGER = "A" + ZERO * 26
+
+def _midpoint(low: str, high: Optional[str]) -> str:
+    # Fractions between low and high (None meaning 1); neither ends in ZERO
+    if high is not None:
+        shared = 0
+        while (low[shared] if shared < len(low) else ZERO) == high[shared]:
+            shared += 1
+        if shared:
+            return high[:shared] + _midpoint(low[shared:], high[shared:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else len(DIGITS)
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid order key head: {head!r}")
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid order key: {key!r}")
+    return key[:length]
+
+def _validate(key: str):
+    if key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid order key: {key!r}")
+    if key[len(_integer_part(key)):].endswith(ZERO):
+        raise ValueError(f"Invalid order key: {key!r}")
+
+def is_valid_key(key: str) -> bool:
+    # For keys that come from outside, e.g. an imported backup
+    if not key or any(c not in DIGITS for c in key):
+        return False
+    try:
+        _validate(key)
+    except ValueError:
+        return False
+    return True
+
+def _increment(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[i]) + 1
+        if digit < len(DIGITS):
+            digits[i] = DIGITS[digit]
+            return head + "".join(digits)
+        digits[i] = ZERO
+    if head == "Z":
+        return "a" + ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(ZERO)
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def _decrement(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[i]) - 1
+        if digit >= 0:
+            digits[i] = DIGITS[digit]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+def key_between(low: Optional[str], high: Optional[str]) -> str:
+    """A key strictly between low and high; None stands for either end of the list."""
+    if low is not None:
+        _validate(low)
+    if high is not None:
+        _validate(high)
+    if low is not None and high is not None and low >= high:
+        raise ValueError(f"Order keys out of order: {low!r} >= {high!r}")
+
+    if low is None:
+        if high is None:
+            return "a" + ZERO
+        integer = _integer_part(high)
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", high[len(integer):])
+        if integer < high:
+            return integer
+        key = _decrement(integer)
+        if key is None:
+            raise ValueError("Cannot place a key before the smallest order key")
+        return key
+
+    integer = _integer_part(low)
+    if high is None:
+        key = _increment(integer)
+        return key if key is not None else integer + _midpoint(low[len(integer):], None)
+    if integer == _integer_part(high):
+        return integer + _midpoint(low[len(integer):], high[len(integer):])
+    key = _increment(integer)
+    if key is not None and key < high:
+        return key
+    return integer + _midpoint(low[len(integer):], None)
+
+def keys_after(low: Optional[str], count: int) -> List[str]:
+    keys = []
+    for _ in range(count):
+        low = key_between(low, None)
+        keys.append(low)
+    return keys
@@ -0,0 +1,165 @@
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+# Fraction of statements under the threshold that are logged anyway, e.g. 0.01
+QUERY_SAMPLE_RATE = float(os.environ.get("QUERY_SAMPLE_RATE", "0"))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+# Bound parameters can carry credentials and personal data, so they stay out of the log unless asked for
+SLOW_QUERY_LOG_PARAMS = os.environ.get("SLOW_QUERY_LOG_PARAMS", "false").lower() in ("1", "true", "yes")
+QUERY_STATS_MAX_STATEMENTS = int(os.environ.get("QUERY_STATS_MAX_STATEMENTS", "1000"))
+
+logger = logging.getLogger("todos.sql")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "with", "update", "delete", "insert")
+
+def normalize_statement(statement: str) -> str:
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _STRING.sub("?", normalized)
+    normalized = _PARAM.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _VALUES_ROWS.sub(r"\1, ...", normalized)
+    return _IN_LIST.sub("(?, ...)", normalized)
+
+class QueryStats:
+    """Aggregate timings per normalized statement, capped at `max_statements` distinct entries."""
+
+    def __init__(self, max_statements: int = QUERY_STATS_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self.dropped = 0
+        self._entries: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float):
+        with self._lock:
+            entry = self._entries.get(statement)
+            if entry is None:
+                if len(self._entries) >= self.max_statements:
+                    self.dropped += 1
+                    return
+                entry = self._entries[statement] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [
+                {
+                    "statement": statement,
+                    "calls": calls,
+                    "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(worst * 1000, 3),
+                }
+                for statement, (calls, total, worst) in self._entries.items()
+            ]
+        key = {"total": "total_ms", "mean": "mean_ms", "max": "max_ms", "calls": "calls"}[order_by]
+        return sorted(rows, key=lambda row: row[key], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+query_stats = QueryStats()
+
+_listener: Optional[QueueListener] = None
+
+def start_query_log(handler: Optional[logging.Handler] = None):
+    # Records go onto an in-memory queue; a background thread does the actual I/O
+    global _listener
+    if _listener is not None:
+        return
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger.handlers = [QueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+def stop_query_log():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # A raw DBAPI cursor keeps the EXPLAIN itself out of the cursor events and the stats
+    cursor = conn.connection.cursor()
+    # On Postgres a failed EXPLAIN would abort the caller's transaction, so fence it in a savepoint
+    savepoint = conn.dialect.name == "postgresql" and conn.in_transaction()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT query_profiler_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+            raise
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT query_profiler_explain")
+    finally:
+        cursor.close()
+    if conn.dialect.name == "sqlite":
+        return "; ".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiler_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("profiler_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    normalized = normalize_statement(statement)
+    query_stats.record(normalized, elapsed)
+
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        plan = None
+        if SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().lower().startswith(_EXPLAINABLE):
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as e:
+                plan = f"unavailable: {e}"
+        params = f" params={parameters!r}" if SLOW_QUERY_LOG_PARAMS else ""
+        logger.warning("slow query %.1f ms: %s%s%s", elapsed_ms, normalized, params, f"\nplan:\n{plan}" if plan else "")
+    elif QUERY_SAMPLE_RATE and random.random() < QUERY_SAMPLE_RATE:
+        logger.info("sampled query %.1f ms: %s", elapsed_ms, normalized)
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("profiler_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def install_query_profiler(engine: Engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,164 @@
+import importlib
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+# "memory" keeps buckets in this worker; anything else is imported as "module:attribute" and
+# called with no arguments, e.g. a backend that stores buckets in a store shared by all workers
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+# Only behind a proxy that sets X-Forwarded-For; otherwise clients could pick their own key
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+# Attempts per minute and burst size, per client IP and per email
+AUTH_IP_PER_MINUTE = float(os.environ.get("AUTH_IP_PER_MINUTE", "30"))
+AUTH_IP_BURST = int(os.environ.get("AUTH_IP_BURST", "20"))
+AUTH_EMAIL_PER_MINUTE = float(os.environ.get("AUTH_EMAIL_PER_MINUTE", "6"))
+AUTH_EMAIL_BURST = int(os.environ.get("AUTH_EMAIL_BURST", "6"))
+
+# After LOGIN_LOCKOUT_THRESHOLD consecutive failures an account is locked for the base time,
+# doubling with each further failure up to the maximum
+LOGIN_LOCKOUT_THRESHOLD = int(os.environ.get("LOGIN_LOCKOUT_THRESHOLD", "5"))
+LOGIN_LOCKOUT_BASE_SECONDS = float(os.environ.get("LOGIN_LOCKOUT_BASE_SECONDS", "30"))
+LOGIN_LOCKOUT_MAX_SECONDS = float(os.environ.get("LOGIN_LOCKOUT_MAX_SECONDS", "3600"))
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets and failure counters.
+
+    take() returns 0 when the attempt is allowed, otherwise the seconds
+    until a token is available. Shared backends must make take() and
+    record_failure() atomic per key.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        ...
+
+    @abstractmethod
+    async def locked_for(self, key: str) -> float:
+        ...
+
+    @abstractmethod
+    async def record_failure(self, key: str) -> float:
+        ...
+
+    @abstractmethod
+    async def clear_failures(self, key: str):
+        ...
+
+    def reset(self):
+        pass
+
+def lockout_seconds(failures: int) -> float:
+    if failures < LOGIN_LOCKOUT_THRESHOLD:
+        return 0.0
+    return min(LOGIN_LOCKOUT_BASE_SECONDS * 2 ** (failures - LOGIN_LOCKOUT_THRESHOLD), LOGIN_LOCKOUT_MAX_SECONDS)
+
+class MemoryBackend(RateLimitBackend):
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        # key -> (tokens, refilled_at) for buckets, (failures, locked_until) for lockouts
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._failures: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        per_second = rate / 60
+        with self._lock:
+            tokens, refilled_at = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - refilled_at) * per_second)
+            if tokens >= 1:
+                self._store(self._buckets, key, (tokens - 1, now))
+                return 0.0
+            self._store(self._buckets, key, (tokens, now))
+            return (1 - tokens) / per_second if per_second > 0 else LOGIN_LOCKOUT_MAX_SECONDS
+
+    async def locked_for(self, key: str) -> float:
+        with self._lock:
+            _, locked_until = self._failures.get(key, (0, 0.0))
+        return max(locked_until - time.monotonic(), 0.0)
+
+    async def record_failure(self, key: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            failures, locked_until = self._failures.get(key, (0, 0.0))
+            # A streak that went quiet for the longest lockout starts over
+            if failures and locked_until + LOGIN_LOCKOUT_MAX_SECONDS < now:
+                failures = 0
+            failures += 1
+            lockout = lockout_seconds(failures)
+            self._store(self._failures, key, (failures, now + lockout))
+        return lockout
+
+    async def clear_failures(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._failures.clear()
+
+    def _store(self, entries: OrderedDict, key: str, value: Tuple):
+        # Evicting the least recently used key only ever forgets a limit, never invents one
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+def load_backend(name: str) -> RateLimitBackend:
+    if name == "memory":
+        return MemoryBackend()
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _too_many(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many attempts, please retry later",
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+    )
+
+class AuthThrottle:
+    """Token buckets per client IP and per email, plus a per-account lockout.
+
+    check() runs before the route touches the database or bcrypt, so a
+    rejected attempt costs a dictionary lookup rather than a hash.
+    """
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self.rejected = 0
+
+    async def check(self, scope: str, request: Request, email: str):
+        email = email.strip().lower()
+        retry_after = await self.backend.take(f"{scope}:ip:{client_ip(request)}", AUTH_IP_PER_MINUTE, AUTH_IP_BURST)
+        if not retry_after and scope == "login":
+            retry_after = await self.backend.locked_for(f"lockout:{email}")
+        if not retry_after:
+            retry_after = await self.backend.take(f"{scope}:email:{email}", AUTH_EMAIL_PER_MINUTE, AUTH_EMAIL_BURST)
+        if retry_after:
+            self.rejected += 1
+            raise _too_many(retry_after)
+
+    async def login_failed(self, email: str):
+        await self.backend.record_failure(f"lockout:{email.strip().lower()}")
+
+    async def login_succeeded(self, email: str):
+        await self.backend.clear_failures(f"lockout:{email.strip().lower()}")
+
+auth_throttle = AuthThrottle(load_backend(RATE_LIMIT_BACKEND))
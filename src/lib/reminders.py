@@ -0,0 +1,317 @@
+import asyncio
+import heapq
+import importlib
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.task import Task
+from ..models.task_revision import TaskRevision
+from .clock import naive_utc, utcnow
+from .events import task_events
+
+logger = logging.getLogger(__name__)
+
+TASK_REMINDERS = os.environ.get("TASK_REMINDERS", "true").lower() in ("1", "true", "yes")
+# "log" only logs each reminder; anything else is imported as "module:attribute" and called with no arguments
+TASK_REMINDER_NOTIFIER = os.environ.get("TASK_REMINDER_NOTIFIER", "log")
+# Only reminders due within the window are held in memory, at most MAX_LOADED of them
+TASK_REMINDER_WINDOW_SECONDS = float(os.environ.get("TASK_REMINDER_WINDOW_SECONDS", "300"))
+TASK_REMINDER_MAX_LOADED = int(os.environ.get("TASK_REMINDER_MAX_LOADED", "1000"))
+# How often a follower tries to take over, and how often the leader checks it still holds the lock
+TASK_REMINDER_LEADER_SECONDS = float(os.environ.get("TASK_REMINDER_LEADER_SECONDS", "30"))
+# With an events backend that stays inside one worker, the leader never hears about other workers'
+# writes and rereads the window this often instead
+TASK_REMINDER_POLL_SECONDS = float(os.environ.get("TASK_REMINDER_POLL_SECONDS", "10"))
+
+# Arbitrary key for pg_try_advisory_lock; whichever worker holds it schedules reminders
+REMINDER_LOCK_KEY = 7_360_118
+
+class ReminderNotifier(ABC):
+    """Delivers a reminder for a task whose remind_at has passed.
+
+    Each reminder is claimed in the database before notify() runs, so it
+    is sent at most once; an exception is logged and the reminder is not
+    retried.
+    """
+
+    @abstractmethod
+    async def notify(self, task: Task):
+        ...
+
+class LogNotifier(ReminderNotifier):
+    async def notify(self, task: Task):
+        logger.info("Reminder for task %d of user %s (due %s)", task.id, task.owner_id, task.due_at)
+
+def load_notifier(name: str) -> ReminderNotifier:
+    if name == "log":
+        return LogNotifier()
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+class ReminderScheduler:
+    """Fires task reminders from an in-memory min-heap of the next window.
+
+    Only the leader (the worker holding a Postgres advisory lock; always
+    this process on other databases) loads reminders due before the window
+    end, sleeps until the earliest, and claims and notifies those that are
+    due. Task events keep the heap current between loads: a write that
+    sets, moves or clears a reminder, completes or deletes a task updates
+    the heap without a query. Memory and queries scale with the reminders
+    due in the window, not with the task table.
+    """
+
+    def __init__(self, window: float = TASK_REMINDER_WINDOW_SECONDS, max_loaded: int = TASK_REMINDER_MAX_LOADED):
+        self.window = timedelta(seconds=window)
+        self.max_loaded = max_loaded
+        self.leader = False
+        self.fired = 0
+        self.failed = 0
+        self._engine: Optional[AsyncEngine] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._notifier: ReminderNotifier = LogNotifier()
+        self._lock_connection: Optional[AsyncConnection] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._reset()
+
+    def _reset(self):
+        # Heap entries are (remind_at, task_id); an entry is live only while _scheduled still maps
+        # the task to that time, so moves and cancellations never search the heap
+        self._heap: List[Tuple[datetime, int]] = []
+        self._scheduled: Dict[int, datetime] = {}
+        self._horizon: Optional[datetime] = None
+        # Events that arrive while a load is reading the window; replayed over its result
+        self._pending: Optional[List[bytes]] = None
+
+    async def start(self, engine: AsyncEngine, session_factory: Callable[[], AsyncSession], notifier: ReminderNotifier):
+        self._engine = engine
+        self._session_factory = session_factory
+        self._notifier = notifier
+        self._wakeup = asyncio.Event()
+        task_events.add_listener(self._on_event)
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task_events.remove_listener(self._on_event)
+        if self._runner is not None:
+            runner, self._runner = self._runner, None
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+        await self._resign()
+
+    def schedule(self, task_id: int, remind_at: Optional[datetime]):
+        if self._horizon is None:
+            return
+        # Past the window: the load that reaches it will pick the reminder up
+        if remind_at is None or remind_at > self._horizon:
+            self._scheduled.pop(task_id, None)
+            return
+        if self._scheduled.get(task_id) == remind_at:
+            return
+        self._scheduled[task_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, task_id))
+        if self._heap[0] == (remind_at, task_id):
+            self._wakeup.set()
+        # Dead entries pile up only under churn; compact before they outnumber the live ones
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [(when, task_id) for task_id, when in self._scheduled.items()]
+            heapq.heapify(self._heap)
+
+    def stats(self) -> Dict[str, int]:
+        return {"leader": int(self.leader), "scheduled": len(self._scheduled), "fired": self.fired, "failed": self.failed}
+
+    def _on_event(self, user_id: Optional[int], message: bytes):
+        if not self.leader:
+            return
+        if self._pending is not None:
+            # A write committed after the load's query would otherwise be lost with the old heap
+            self._pending.append(message)
+            return
+        event = orjson.loads(message)
+        if event.get("type") != "changes":
+            # Changes were too large to send, or events were lost: reread the window
+            self._horizon = None
+            self._wakeup.set()
+            return
+        for row in event["changes"]:
+            pending = not (row.get("deleted") or row.get("completed") or row.get("reminded"))
+            self.schedule(row["id"], _parse_time(row.get("remind_at")) if pending else None)
+
+    async def _run(self):
+        while True:
+            try:
+                if not await self._lead():
+                    await asyncio.sleep(TASK_REMINDER_LEADER_SECONDS)
+                    continue
+                if self._horizon is None or utcnow() >= self._horizon or self._polling():
+                    await self._load()
+                await self._fire_due()
+                await self._sleep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reminder scheduler failed")
+                await self._resign()
+                await asyncio.sleep(TASK_REMINDER_LEADER_SECONDS)
+
+    async def _lead(self) -> bool:
+        if self._engine.dialect.name != "postgresql":
+            self.leader = True
+            return True
+        if self._lock_connection is not None:
+            # The lock lives as long as its connection; a dropped connection means another worker may lead
+            try:
+                await self._lock_connection.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                logger.warning("Lost the reminder scheduler lock connection")
+                await self._resign()
+        connection = await self._engine.connect()
+        try:
+            # Autocommit, so the lock connection is never left idle inside a transaction
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            acquired = (await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": REMINDER_LOCK_KEY})).scalar()
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return False
+        self._lock_connection = connection
+        self.leader = True
+        logger.info("This worker now schedules task reminders")
+        if self._polling():
+            logger.warning(
+                "Task events do not reach other workers; polling for reminders every %ss (set TASK_EVENTS_BACKEND=postgres)",
+                TASK_REMINDER_POLL_SECONDS,
+            )
+        return True
+
+    def _polling(self) -> bool:
+        # Only a Postgres leader can be one of several workers
+        return self._lock_connection is not None and not task_events.backend.cross_worker
+
+    async def _resign(self):
+        self.leader = False
+        self._reset()
+        connection, self._lock_connection = self._lock_connection, None
+        if connection is not None:
+            try:
+                # Closing the session releases the advisory lock; returning it to the pool would not
+                await connection.invalidate()
+                await connection.close()
+            except Exception:
+                logger.debug("Closing the reminder lock connection failed", exc_info=True)
+
+    async def _load(self):
+        horizon = utcnow() + self.window
+        self._horizon = None
+        self._pending = []
+        try:
+            async with self._session_factory() as session:
+                rows = (await session.exec(
+                    select(Task.id, Task.remind_at)
+                    .where(Task.reminded == False, Task.remind_at <= horizon, Task.completed == False, Task.deleted == False)
+                    .order_by(Task.remind_at.asc())
+                    .limit(self.max_loaded)
+                )).all()
+            self._heap = [(remind_at, task_id) for task_id, remind_at in rows]
+            heapq.heapify(self._heap)
+            self._scheduled = {task_id: when for when, task_id in self._heap}
+            # A full page shrinks the window to what was loaded; the rest is read when it comes up
+            self._horizon = max(self._scheduled.values()) if len(rows) >= self.max_loaded else horizon
+        finally:
+            pending, self._pending = self._pending, None
+        # Replaying one the query already saw only sets the same time again
+        for message in pending:
+            self._on_event(None, message)
+
+    async def _fire_due(self):
+        now = utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, task_id = heapq.heappop(self._heap)
+            if self._scheduled.get(task_id) == when:
+                del self._scheduled[task_id]
+                due.append(task_id)
+        if not due:
+            return
+        claimable = (Task.reminded == False, Task.remind_at <= now, Task.completed == False, Task.deleted == False)
+        async with self._session_factory() as session:
+            rows = (await session.exec(select(Task.owner_id, Task.id).where(Task.id.in_(due), Task.owner_id != None, *claimable))).all()
+        by_owner: Dict[int, List[int]] = {}
+        for owner_id, task_id in rows:
+            by_owner.setdefault(owner_id, []).append(task_id)
+        tasks = []
+        # One short transaction per owner, so the scheduler never holds two owners' revision locks at once
+        for owner_id in sorted(by_owner):
+            tasks.extend(await self._claim(owner_id, by_owner[owner_id], claimable))
+        for task in tasks:
+            try:
+                await self._notifier.notify(task)
+                self.fired += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Reminder notification for task %d failed", task.id)
+
+    async def _claim(self, owner_id: int, task_ids: List[int], claimable: tuple) -> List[Task]:
+        async with self._session_factory() as session:
+            # Reminded is part of the task, so the claim is a write like any other: under the owner's
+            # revision lock, with a new version, so ETags, cached lists and delta sync all see it
+            revision = (await session.exec(
+                update(TaskRevision)
+                .where(TaskRevision.owner_id == owner_id)
+                .values(revision=TaskRevision.revision + 1)
+                .returning(TaskRevision.revision)
+            )).scalar_one_or_none()
+            if revision is None:
+                await session.rollback()
+                return []
+            # Re-checked under the lock, so a reminder moved or a task completed since loading is skipped,
+            # and a reminder is never sent twice
+            tasks = (await session.exec(
+                update(Task)
+                .where(Task.id.in_(task_ids), Task.owner_id == owner_id, *claimable)
+                .values(reminded=True, version=revision, updated_at=utcnow())
+                .returning(Task)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            if not tasks:
+                await session.rollback()
+                return []
+            await session.commit()
+        await task_events.publish(owner_id, revision, tasks)
+        return tasks
+
+    async def _sleep(self):
+        now = utcnow()
+        wake_at = min(self._heap[0][0] if self._heap else self._horizon, self._horizon)
+        timeout = (wake_at - now).total_seconds()
+        if self._lock_connection is not None:
+            timeout = min(timeout, TASK_REMINDER_POLL_SECONDS if self._polling() else TASK_REMINDER_LEADER_SECONDS)
+        if timeout <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+task_reminders = ReminderScheduler()
@@ -0,0 +1,93 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+REPLICA_HEALTH_CHECK_SECONDS = float(os.environ.get("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "10"))
+
+# Replay lag is zero while the replica has replayed everything it received, even if the
+# primary has been idle; otherwise it is the age of the last replayed transaction
+_POSTGRES_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaSet:
+    """Round-robin over read replicas, skipping any that failed a check or a query."""
+
+    def __init__(self, engines: List[AsyncEngine], retry_after: float = REPLICA_RETRY_SECONDS, max_lag: float = REPLICA_MAX_LAG_SECONDS):
+        self.engines = engines
+        self.retry_after = retry_after
+        self.max_lag = max_lag
+        self._down_until: Dict[AsyncEngine, float] = {}
+        self._counter = itertools.count()
+
+    def pick(self) -> Optional[AsyncEngine]:
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._counter) % len(self.engines)]
+            if self.is_healthy(engine):
+                return engine
+        return None
+
+    def is_healthy(self, engine: AsyncEngine) -> bool:
+        return self._down_until.get(engine, 0) <= time.monotonic()
+
+    def mark_down(self, engine: AsyncEngine):
+        self._down_until[engine] = time.monotonic() + self.retry_after
+
+    def mark_up(self, engine: AsyncEngine):
+        self._down_until.pop(engine, None)
+
+    async def check(self):
+        for engine in self.engines:
+            try:
+                lag = await probe_lag(engine)
+            except Exception:
+                self.mark_down(engine)
+                continue
+            if lag > self.max_lag:
+                self.mark_down(engine)
+            else:
+                self.mark_up(engine)
+
+    async def run_health_checks(self, interval: float = REPLICA_HEALTH_CHECK_SECONDS):
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+async def probe_lag(engine: AsyncEngine) -> float:
+    async with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            return float(await connection.scalar(_POSTGRES_LAG))
+        await connection.execute(text("SELECT 1"))
+        return 0.0
+
+class RecentWriters:
+    """Users who wrote within the last `window` seconds; their reads stay on the primary.
+
+    Kept per process: with several workers, stickiness holds for requests that land on
+    the worker that served the write.
+    """
+
+    def __init__(self, window: float, max_entries: int = 100_000):
+        self.window = window
+        self.max_entries = max_entries
+        self._until: Dict[int, float] = {}
+
+    def mark(self, user_id: int):
+        now = time.monotonic()
+        if len(self._until) >= self.max_entries:
+            self._until = {uid: until for uid, until in self._until.items() if until > now}
+        self._until[user_id] = now + self.window
+
+    def is_recent(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
@@ -0,0 +1,131 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from .clock import as_utc, naive_utc
+from .ordering import is_valid_key
+
+# Everything an import needs to rebuild the list: its order, schedule and history, not just the text.
+# reminded travels with remind_at so restoring a backup does not resend reminders that already went out
+EXPORT_FIELDS = ["id", "title", "description", "completed", "position", "due_at", "remind_at", "reminded", "created_at"]
+TIME_FIELDS = ("due_at", "remind_at", "created_at")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_row(task: Any) -> Dict[str, Any]:
+    row = {field: getattr(task, field) for field in EXPORT_FIELDS}
+    for field in TIME_FIELDS:
+        if row[field] is not None:
+            row[field] = as_utc(row[field]).isoformat().replace("+00:00", "Z")
+    return row
+
+def format_ndjson(rows: Iterable[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(row, separators=(",", ":"), ensure_ascii=False) + "\n" for row in rows)
+
+def format_csv(rows: Iterable[Dict[str, Any]], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore", lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+def _parse_bool(value: Any, name: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value in (None, ""):
+        return False
+    if isinstance(value, str) and value.strip().lower() in ("true", "1", "yes"):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(f"{name} must be a boolean")
+
+def _parse_time(value: Any, name: str) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    try:
+        return naive_utc(datetime.fromisoformat(value.strip().replace("Z", "+00:00")))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp") from None
+
+def _parse_position(value: Any) -> Optional[str]:
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str) or not is_valid_key(value):
+        raise ValueError("position must be an order key")
+    return value
+
+def _task_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    title = row.get("title")
+    if not isinstance(title, str) or not title:
+        raise ValueError("title is required")
+    description = row.get("description") or None
+    if description is not None and not isinstance(description, str):
+        raise ValueError("description must be a string")
+    item = {
+        "title": title,
+        "description": description,
+        "completed": _parse_bool(row.get("completed"), "completed"),
+        "position": _parse_position(row.get("position")),
+        "reminded": _parse_bool(row.get("reminded"), "reminded"),
+    }
+    for field in TIME_FIELDS:
+        item[field] = _parse_time(row.get(field), field)
+    return item
+
+ParsedRow = Tuple[int, Union[Dict[str, Any], str]]
+
+async def parse_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            yield line_number, _task_item(row)
+        except ValueError as e:
+            yield line_number, str(e)
+
+async def parse_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[ParsedRow]:
+    header: List[str] = []
+    record, record_start, line_number = "", 0, 0
+    async for line in _lines(chunks):
+        line_number += 1
+        record = f"{record}\n{line}" if record else line
+        record_start = record_start or line_number
+        # A quoted field may span lines; the record is complete once its quotes balance
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        start, record, record_start = record_start, "", 0
+        if not values:
+            continue
+        if not header:
+            header = [value.strip().lower() for value in values]
+            continue
+        try:
+            yield start, _task_item(dict(zip(header, values)))
+        except ValueError as e:
+            yield start, str(e)
+    if record:
+        yield record_start, "unterminated quoted field"
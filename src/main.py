@@ -1,21 +1,72 @@
 from dotenv import load_dotenv
 load_dotenv() # Load environment variables from .env
 
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sqlmodel import SQLModel
 
-from .db import engine, create_db_and_tables
+from .db import DB_MAX_OVERFLOW, DB_POOL_PREWARM, DB_POOL_SIZE, async_engine, async_session_maker, engine, prewarm_pool, replicas
+from .jobs.archiver import TASK_ARCHIVE_AFTER_DAYS, run_archiver
+from .jobs.positions import run_position_rebalancer
+from .jobs.sessions import run_refresh_token_purger
+from .jobs.task_counts import run_daily_count_pruner
+from .jobs.tombstones import run_tombstone_compactor
+from .lib.events import TASK_EVENTS_BACKEND, load_backend, task_events
+from .lib.group_commit import TASK_GROUP_COMMIT
+from .lib.metrics import MetricsMiddleware, instrument_engine, pool_stats, render_metrics
+from .lib.reminders import TASK_REMINDER_NOTIFIER, TASK_REMINDERS, load_notifier, task_reminders
+from .lib.query_profiler import install_query_profiler, query_stats, start_query_log, stop_query_log
+from .lib.security import shutdown_hash_executor
+from .middleware.jwt import require_metrics_token
+from .migrations import ensure_schema
 from .routes import auth # Placeholder for auth routes
 from .routes import tasks # Placeholder for tasks routes
+from .services.task_service import task_writes
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Creating tables...")
-    create_db_and_tables()
+    # A single version check when the schema is current
+    for migration in ensure_schema(engine):
+        print(f"Applied migration {migration.version:04d}: {migration.description}")
+    # Open connections now so the first requests after a deploy don't pay for connection setup
+    warm = min(DB_POOL_PREWARM, DB_POOL_SIZE)
+    if warm > 0:
+        for request_engine in [async_engine] + replicas.engines:
+            await prewarm_pool(request_engine, warm)
+    await task_events.start(load_backend(TASK_EVENTS_BACKEND, async_engine))
+    if TASK_GROUP_COMMIT:
+        await task_writes.start()
+    # Every worker starts one; only the one that wins the leader lock schedules
+    if TASK_REMINDERS:
+        await task_reminders.start(async_engine, async_session_maker, load_notifier(TASK_REMINDER_NOTIFIER))
+    background = [
+        asyncio.create_task(run_tombstone_compactor()),
+        asyncio.create_task(run_position_rebalancer()),
+        asyncio.create_task(run_refresh_token_purger()),
+        asyncio.create_task(run_daily_count_pruner()),
+    ]
+    if TASK_ARCHIVE_AFTER_DAYS > 0:
+        background.append(asyncio.create_task(run_archiver()))
+    if replicas.engines:
+        background.append(asyncio.create_task(replicas.run_health_checks()))
     yield
+    for job in background:
+        job.cancel()
+    for job in background:
+        with suppress(asyncio.CancelledError):
+            await job
+    await task_reminders.stop()
+    await task_writes.stop()
+    # Ends open event streams, so the server is not left waiting on them
+    await task_events.stop()
+    shutdown_hash_executor()
+    for request_engine in [async_engine] + replicas.engines:
+        await request_engine.dispose()
+    stop_query_log()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -32,7 +83,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+# Added last so it wraps everything else, CORS included
+app.add_middleware(MetricsMiddleware)
+
+instrument_engine(engine, "schema")
+instrument_engine(async_engine.sync_engine, "primary", DB_MAX_OVERFLOW)
+for index, replica in enumerate(replicas.engines):
+    instrument_engine(replica.sync_engine, f"replica{index}", DB_MAX_OVERFLOW)
+for instrumented in [engine, async_engine.sync_engine] + [replica.sync_engine for replica in replicas.engines]:
+    install_query_profiler(instrumented)
+start_query_log()
 
 # Include API routes
 app.include_router(auth.router, prefix="/api", tags=["auth"])
@@ -41,3 +103,18 @@ app.include_router(tasks.router, prefix="/api", tags=["tasks"])
 @app.get("/api/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/api/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics/queries", dependencies=[Depends(require_metrics_token)])
+def query_report(
+    limit: int = Query(20, ge=1, le=500),
+    order: str = Query("total", pattern="^(total|mean|max|calls)$"),
+):
+    return {"statements": query_stats.top(limit, order), "dropped": query_stats.dropped}
+
+@app.get("/api/metrics/pool", dependencies=[Depends(require_metrics_token)])
+def pool_report():
+    return pool_stats()
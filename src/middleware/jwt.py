@@ -1,23 +1,81 @@
-from typing import Annotated
+import secrets
+from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
+from sqlalchemy import event, inspect
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..db import get_session
-from ..lib.jwt import verify_access_token
+from ..db import async_session_maker, get_read_session, is_primary_session
+from ..lib.jwt import decode_access_token
+from ..lib.metrics import METRICS_TOKEN
+from ..lib.principal_cache import principal_cache
 from ..models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
+metrics_scheme = HTTPBearer(auto_error=False)
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Annotated[AsyncSession, Depends(get_read_session)]) -> User:
+    return await authenticate(token, session)
+
+async def get_stream_user(token: Annotated[str, Depends(oauth2_scheme)], session: Annotated[AsyncSession, Depends(get_read_session)]) -> User:
+    return await authenticate_stream(token, session)
+
+async def require_metrics_token(credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(metrics_scheme)]):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not secrets.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+async def authenticate_stream(token: str, session: AsyncSession) -> User:
+    # Event streams stay open for hours; closing the session hands its pooled connection back
+    # instead of keeping it checked out for as long as the stream lives
+    try:
+        return await authenticate(token, session)
+    finally:
+        await session.close()
+
+async def authenticate(token: str, session: AsyncSession) -> User:
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Annotated[Session, Depends(get_session)]) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    user_id = verify_access_token(token, credentials_exception)
-    user = session.get(User, user_id)
-    if user is None:
+    payload = decode_access_token(token, credentials_exception)
+    try:
+        user_id = int(payload["sub"])
+    except (TypeError, ValueError):
         raise credentials_exception
-    return user
+    user = await session.get(User, user_id)
+    if user is None and not is_primary_session(session):
+        # A just-created account may not have reached the replica yet
+        async with async_session_maker() as primary:
+            user = await primary.get(User, user_id)
+    # Tokens issued before the last revoke-all carry an older version (tokens without one predate versions)
+    if user is None or payload.get("ver", 0) != user.token_version:
+        raise credentials_exception
+
+    # Cache a detached copy so the principal is never tied to this request's session
+    principal = User(**user.model_dump())
+    principal_cache.set(token, user_id, principal, payload.get("exp"))
+    return principal
+
+def invalidate_user_principals(user_id: int):
+    principal_cache.invalidate_user(user_id)
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target: User):
+    invalidate_user_principals(target.id)
+
+@event.listens_for(User, "after_update")
+def _invalidate_user_on_password_change(mapper, connection, target: User):
+    if inspect(target).attrs.hashed_password.history.has_changes():
+        invalidate_user_principals(target.id)
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from . import m0001_initial, m0002_task_counts, m0003_refresh_tokens, m0004_task_archive, m0005_task_positions, m0006_task_reminders, m0007_revision_epoch, m0008_task_id_autoincrement, m0009_user_token_version, m0010_task_sync_backfill
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, m0001_initial.DESCRIPTION, m0001_initial.upgrade),
+    Migration(2, m0002_task_counts.DESCRIPTION, m0002_task_counts.upgrade),
+    Migration(3, m0003_refresh_tokens.DESCRIPTION, m0003_refresh_tokens.upgrade),
+    Migration(4, m0004_task_archive.DESCRIPTION, m0004_task_archive.upgrade),
+    Migration(5, m0005_task_positions.DESCRIPTION, m0005_task_positions.upgrade),
+    Migration(6, m0006_task_reminders.DESCRIPTION, m0006_task_reminders.upgrade),
+    Migration(7, m0007_revision_epoch.DESCRIPTION, m0007_revision_epoch.upgrade),
+    Migration(8, m0008_task_id_autoincrement.DESCRIPTION, m0008_task_id_autoincrement.upgrade),
+    Migration(9, m0009_user_token_version.DESCRIPTION, m0009_user_token_version.upgrade),
+    Migration(10, m0010_task_sync_backfill.DESCRIPTION, m0010_task_sync_backfill.upgrade),
+]
+HEAD = MIGRATIONS[-1].version
+
+# Arbitrary key for pg_advisory_xact_lock, so concurrent boots apply each migration once
+MIGRATION_LOCK_KEY = 7_360_117
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+def current_version(connection: Connection) -> int:
+    return connection.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar_one()
+
+def read_version(engine: Engine) -> Optional[int]:
+    # One query on the fast path; None means the version table has never been created
+    with engine.connect() as connection:
+        try:
+            return current_version(connection)
+        except DBAPIError:
+            return None
+
+def upgrade(engine: Engine, target: int = HEAD) -> List[Migration]:
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            schema_version.create(connection, checkfirst=True)
+            # Re-read under the lock: another process may have applied it while we waited
+            if migration.version <= current_version(connection):
+                continue
+            migration.upgrade(connection)
+            connection.execute(schema_version.insert().values(version=migration.version, description=migration.description))
+        applied.append(migration)
+    return applied
+
+def ensure_schema(engine: Engine) -> List[Migration]:
+    version = read_version(engine)
+    if version is not None and version >= HEAD:
+        return []
+    return upgrade(engine)
+
+def history(engine: Engine):
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(schema_version.name):
+            return []
+        return connection.execute(select(schema_version).order_by(schema_version.c.version)).all()
@@ -0,0 +1,39 @@
+"""Apply or inspect schema migrations.
+
+    python -m src.migrations upgrade [--to VERSION]
+    python -m src.migrations current
+    python -m src.migrations history
+"""
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from ..db import engine
+from . import HEAD, MIGRATIONS, history, read_version, upgrade
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m src.migrations", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply = commands.add_parser("upgrade", help="apply pending migrations")
+    apply.add_argument("--to", type=int, default=HEAD, help="stop after this version")
+    commands.add_parser("current", help="print the applied and latest versions")
+    commands.add_parser("history", help="list every migration and when it was applied")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        for migration in applied:
+            print(f"applied {migration.version:04d} {migration.description}")
+        if not applied:
+            print("nothing to apply")
+    elif args.command == "current":
+        print(f"current {read_version(engine) or 0}, head {HEAD}")
+    else:
+        applied = {row.version: row.applied_at for row in history(engine)}
+        for migration in MIGRATIONS:
+            when = applied.get(migration.version)
+            print(f"{migration.version:04d} {'applied ' + str(when) if when else 'pending':<30} {migration.description}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+from ..lib.clock import utcnow
+from ..services.task_search import install_search
+from .ops import add_column, create_indexes
+
+DESCRIPTION = "Baseline schema, task sync columns, owner-scoped indexes and search"
+
+# The schema as of this version; later migrations change it, the models describe only the latest
+metadata = MetaData()
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Index("ix_users_email", "email", unique=True),
+)
+
+task = Table(
+    "task",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("title", String, nullable=False),
+    Column("description", String),
+    Column("completed", Boolean, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("deleted", Boolean, nullable=False),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    # owner_id leads every index: each TaskService query is scoped to one owner
+    Index("ix_task_owner_id_id", "owner_id", "id"),
+    Index("ix_task_owner_id_version", "owner_id", "version"),
+    Index("ix_task_deleted_updated_at", "deleted", "updated_at"),
+)
+
+task_revisions = Table(
+    "task_revisions",
+    metadata,
+    Column("owner_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("revision", Integer, nullable=False),
+    Column("compacted_version", Integer, nullable=False),
+)
+
+def upgrade(connection: Connection):
+    # Creates whatever is missing, including every table on a fresh database
+    metadata.create_all(connection)
+
+    # Databases created before task versions and tombstones only have the original columns
+    add_column(connection, task, "version", "0")
+    add_column(connection, task, "updated_at", f"'{utcnow().isoformat(sep=' ')}'")
+    add_column(connection, task, "deleted", "false")
+    create_indexes(connection, task, ("ix_task_owner_id_id", "ix_task_owner_id_version", "ix_task_deleted_updated_at"))
+
+    install_search(connection)
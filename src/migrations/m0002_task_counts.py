@@ -0,0 +1,74 @@
+from collections import Counter
+
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, Table, case, delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from ..lib.clock import utcnow
+from ..models.task_stats import recent_since
+from .ops import add_column
+
+DESCRIPTION = "Task creation time and materialized per-user task counters"
+
+metadata = MetaData()
+
+# Referenced by the foreign keys below; only its key matters here
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+# The task columns this migration reads or adds
+task = Table(
+    "task",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("completed", Boolean, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("deleted", Boolean, nullable=False),
+    Column("owner_id", Integer),
+    Column("created_at", DateTime, nullable=False),
+)
+
+task_counts = Table(
+    "task_counts",
+    metadata,
+    Column("owner_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("total", Integer, nullable=False),
+    Column("completed", Integer, nullable=False),
+)
+
+task_daily_counts = Table(
+    "task_daily_counts",
+    metadata,
+    Column("owner_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("created", Integer, nullable=False),
+)
+
+def upgrade(connection: Connection):
+    add_column(connection, task, "created_at", f"'{utcnow().isoformat(sep=' ')}'")
+    # The closest record of when an existing task was created is its last write
+    connection.execute(update(task).where(task.c.created_at > task.c.updated_at).values(created_at=task.c.updated_at))
+
+    task_counts.create(connection, checkfirst=True)
+    task_daily_counts.create(connection, checkfirst=True)
+
+    # Backfill from scratch; this runs before any write can maintain the counters
+    live = (task.c.deleted == False, task.c.owner_id.isnot(None))
+    connection.execute(delete(task_counts))
+    connection.execute(insert(task_counts).from_select(
+        ["owner_id", "total", "completed"],
+        select(task.c.owner_id, func.count(), func.sum(case((task.c.completed == True, 1), else_=0)))
+        .where(*live)
+        .group_by(task.c.owner_id),
+    ))
+
+    created = Counter(
+        (owner_id, created_at.date())
+        for owner_id, created_at in connection.execute(
+            select(task.c.owner_id, task.c.created_at).where(*live, task.c.created_at >= recent_since(utcnow().date()))
+        )
+    )
+    connection.execute(delete(task_daily_counts))
+    if created:
+        connection.execute(
+            insert(task_daily_counts),
+            [{"owner_id": owner_id, "day": day, "created": count} for (owner_id, day), count in created.items()],
+        )
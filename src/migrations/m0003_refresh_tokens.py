@@ -0,0 +1,28 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+DESCRIPTION = "Refresh token table for rotating sessions"
+
+metadata = MetaData()
+
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+refresh_tokens = Table(
+    "refresh_tokens",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("token_hash", String, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("family_id", String, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+    Column("used_at", DateTime),
+    Column("revoked", Boolean, nullable=False),
+    Index("ix_refresh_tokens_token_hash", "token_hash", unique=True),
+    Index("ix_refresh_tokens_user_id", "user_id"),
+    Index("ix_refresh_tokens_family_id", "family_id"),
+)
+
+def upgrade(connection: Connection):
+    # Creates the table together with its indexes
+    refresh_tokens.create(connection, checkfirst=True)
@@ -0,0 +1,41 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.engine import Connection
+
+from .ops import create_indexes
+
+DESCRIPTION = "Archive table for completed tasks"
+
+metadata = MetaData()
+
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+task = Table(
+    "task",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("completed", Boolean, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    # The archiver looks for live tasks completed before a cutoff
+    Index("ix_task_completed_updated_at", "completed", "updated_at"),
+)
+
+# The task columns as of this version, plus archived_at; ids are kept from the task table
+task_archive = Table(
+    "task_archive",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("title", String, nullable=False),
+    Column("description", String),
+    Column("completed", Boolean, nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("deleted", Boolean, nullable=False),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_task_archive_owner_id_id", "owner_id", "id"),
+)
+
+def upgrade(connection: Connection):
+    task_archive.create(connection, checkfirst=True)
+    create_indexes(connection, task, ("ix_task_completed_updated_at",))
@@ -0,0 +1,61 @@
+from itertools import groupby
+
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, bindparam, select, update
+from sqlalchemy.engine import Connection
+
+from ..lib.ordering import keys_after
+from .ops import add_column, create_indexes
+
+DESCRIPTION = "Fractional order keys for manual task ordering"
+
+# Order keys only sort correctly byte by byte, so Postgres must not apply a locale collation
+POSITION_TYPE = String().with_variant(String(collation="C"), "postgresql")
+
+metadata = MetaData()
+
+task = Table(
+    "task",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("owner_id", Integer),
+    Column("position", POSITION_TYPE),
+    Index("ix_task_owner_id_position", "owner_id", "position"),
+)
+
+task_archive = Table(
+    "task_archive",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("owner_id", Integer),
+    Column("position", POSITION_TYPE),
+    Index("ix_task_archive_owner_id_position", "owner_id", "position"),
+)
+
+def upgrade(connection: Connection):
+    tables = (task, task_archive)
+    for table in tables:
+        add_column(connection, table, "position", "NULL")
+
+    # Existing lists keep their creation (id) order; archived tasks take their place in the same
+    # sequence, so a restored task lands back where it was
+    rows = sorted(
+        (owner_id, task_id, table.name)
+        for table in tables
+        for owner_id, task_id in connection.execute(
+            select(table.c.owner_id, table.c.id).where(table.c.owner_id.isnot(None), table.c.position.is_(None))
+        )
+    )
+    updates = {table.name: [] for table in tables}
+    for _, owned in groupby(rows, key=lambda row: row[0]):
+        owned = list(owned)
+        for (_, task_id, name), position in zip(owned, keys_after(None, len(owned))):
+            updates[name].append({"task_id": task_id, "new_position": position})
+    for table in tables:
+        if updates[table.name]:
+            connection.execute(
+                update(table).where(table.c.id == bindparam("task_id")).values(position=bindparam("new_position")),
+                updates[table.name],
+            )
+
+    create_indexes(connection, task, ("ix_task_owner_id_position",))
+    create_indexes(connection, task_archive, ("ix_task_archive_owner_id_position",))
@@ -0,0 +1,30 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+from .ops import add_column, create_indexes
+
+DESCRIPTION = "Task due dates and reminders"
+
+metadata = MetaData()
+
+def _schedule_table(name: str, *indexes: Index) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("due_at", DateTime),
+        Column("remind_at", DateTime),
+        Column("reminded", Boolean, nullable=False),
+        *indexes,
+    )
+
+# The scheduler reads only the next window of unsent reminders
+task = _schedule_table("task", Index("ix_task_reminded_remind_at", "reminded", "remind_at"))
+task_archive = _schedule_table("task_archive")
+
+def upgrade(connection: Connection):
+    for table in (task, task_archive):
+        add_column(connection, table, "due_at", "NULL")
+        add_column(connection, table, "remind_at", "NULL")
+        add_column(connection, table, "reminded", "false")
+    create_indexes(connection, task, ("ix_task_reminded_remind_at",))
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+from ..lib.clock import utcnow
+from .ops import add_column
+
+DESCRIPTION = "Creation time on task revision rows, for ETags that survive a recreated row"
+
+task_revisions = Table(
+    "task_revisions",
+    MetaData(),
+    Column("owner_id", Integer, primary_key=True),
+    Column("created_at", DateTime),
+)
+
+def upgrade(connection: Connection):
+    add_column(connection, task_revisions, "created_at", f"'{utcnow().isoformat(sep=' ')}'")
@@ -0,0 +1,42 @@
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.engine import Connection
+
+DESCRIPTION = "Never reuse task ids on SQLite, so an archived task can always be restored"
+
+def upgrade(connection: Connection):
+    # Postgres sequences never hand an id out twice. SQLite reuses the highest rowid once its row is
+    # deleted, which archiving does, unless the table is declared AUTOINCREMENT
+    if connection.dialect.name != "sqlite":
+        return
+    name = "task"
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}).scalar_one()
+    if "AUTOINCREMENT" not in sql.upper():
+        _rebuild(connection, name)
+    # Start past every id handed out so far, archived ones included
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+    connection.execute(
+        text(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT :name, COALESCE(MAX(id), 0) "
+            f"FROM (SELECT id FROM {name} UNION ALL SELECT id FROM task_archive)"
+        ),
+        {"name": name},
+    )
+
+def _rebuild(connection: Connection, name: str):
+    # SQLite cannot change a primary key in place: copy the rows into a new table with the same
+    # columns and indexes as the existing one, not the current model's
+    old = Table(name, MetaData(), autoload_with=connection)
+    target = MetaData()
+    # Reflection pulled in the tables it references; the copy's foreign keys resolve against them
+    for table in old.metadata.tables.values():
+        if table is not old:
+            table.to_metadata(target)
+    new = old.to_metadata(target)
+    new.dialect_kwargs["sqlite_autoincrement"] = True
+    for index in old.indexes:
+        index.drop(connection)
+    connection.execute(text(f"ALTER TABLE {name} RENAME TO {name}_old"))
+    new.create(connection)
+    columns = ", ".join(column.name for column in old.columns)
+    connection.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {name}_old"))
+    connection.execute(text(f"DROP TABLE {name}_old"))
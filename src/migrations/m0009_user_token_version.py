@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+from .ops import add_column
+
+DESCRIPTION = "Token version on users, so revoking all sessions also ends their access tokens"
+
+users = Table(
+    "users",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("token_version", Integer, nullable=False),
+)
+
+def upgrade(connection: Connection):
+    add_column(connection, users, "token_version", "0")
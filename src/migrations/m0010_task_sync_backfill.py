@@ -0,0 +1,38 @@
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+
+from ..lib.clock import utcnow
+
+DESCRIPTION = "Revision rows and versions for tasks written before delta sync"
+
+# Rows that share a version are always returned on one delta page, so legacy rows are versioned
+# in chunks rather than all at once
+CHUNK_SIZE = 500
+
+def upgrade(connection: Connection):
+    # Version 0 is what migration 1 gave existing rows; delta sync only reports versions above a cursor,
+    # so those rows were invisible even to a full sync
+    owners = connection.execute(text(
+        "SELECT DISTINCT owner_id FROM task WHERE version = 0 AND owner_id IS NOT NULL ORDER BY owner_id"
+    )).scalars().all()
+    bump = text("UPDATE task SET version = :version WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+    for owner_id in owners:
+        revision = connection.execute(
+            text("SELECT revision FROM task_revisions WHERE owner_id = :owner_id"), {"owner_id": owner_id}
+        ).scalar()
+        if revision is None:
+            connection.execute(
+                text("INSERT INTO task_revisions (owner_id, revision, compacted_version, created_at) VALUES (:owner_id, 0, 0, :now)"),
+                {"owner_id": owner_id, "now": utcnow()},
+            )
+            revision = 0
+        ids = connection.execute(
+            text("SELECT id FROM task WHERE owner_id = :owner_id AND version = 0 ORDER BY id"), {"owner_id": owner_id}
+        ).scalars().all()
+        for start in range(0, len(ids), CHUNK_SIZE):
+            revision += 1
+            connection.execute(bump, {"version": revision, "ids": ids[start:start + CHUNK_SIZE]})
+        connection.execute(
+            text("UPDATE task_revisions SET revision = :revision WHERE owner_id = :owner_id"),
+            {"owner_id": owner_id, "revision": revision},
+        )
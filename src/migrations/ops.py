@@ -0,0 +1,25 @@
+from sqlalchemy import Index, Table, inspect, text
+from sqlalchemy.engine import Connection
+
+# Migrations describe the tables of their own version, never the current models, so a fresh
+# database takes the same steps as an upgraded one. Helpers are still idempotent: databases from
+# before migrations were created from whatever the models were at the time
+
+def add_column(connection: Connection, table: Table, name: str, default: str):
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    if name in existing:
+        return
+    column = table.c[name]
+    type_sql = column.type.compile(dialect=connection.dialect)
+    not_null = "" if column.nullable else " NOT NULL"
+    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {type_sql}{not_null} DEFAULT {default}"))
+
+def create_index(connection: Connection, index: Index):
+    index.create(connection, checkfirst=True)
+
+def create_indexes(connection: Connection, table: Table, names):
+    # Migrations name the indexes of their own version: the model may already declare indexes
+    # on columns that a later migration adds
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        create_index(connection, indexes[name])
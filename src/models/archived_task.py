@@ -0,0 +1,44 @@
+# archived_task.py
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+from ..lib.clock import utcnow
+from .task import POSITION_TYPE, Task
+
+class ArchivedTask(SQLModel, table=True):
+    """Completed tasks moved out of the task table by jobs.archiver.
+
+    Same columns as Task, so rows move between the tables unchanged; the
+    archive only ever holds live, completed tasks.
+    """
+
+    __tablename__ = "task_archive"
+    __table_args__ = (
+        Index("ix_task_archive_owner_id_id", "owner_id", "id"),
+        Index("ix_task_archive_owner_id_position", "owner_id", "position"),
+    )
+
+    # Keeps the id the task had in the task table
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    title: str
+    description: Optional[str] = None
+    completed: bool = True
+    position: Optional[str] = Field(default=None, sa_type=POSITION_TYPE)
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
+    reminded: bool = False
+    version: int = 0
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+    deleted: bool = False
+    owner_id: Optional[int] = Field(default=None, foreign_key="users.id")
+    archived_at: datetime = Field(default_factory=utcnow)
+
+    def to_task(self) -> Task:
+        return Task(**{field: getattr(self, field) for field in Task.model_fields})
+
+# Columns shared with Task, in the same order in both tables
+ARCHIVE_COLUMNS = list(Task.model_fields)
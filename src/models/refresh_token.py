@@ -0,0 +1,21 @@
+# refresh_token.py
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+from ..lib.clock import utcnow
+
+class RefreshToken(SQLModel, table=True):
+    __tablename__ = "refresh_tokens"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # SHA-256 of the token; the token itself is never stored
+    token_hash: str = Field(unique=True, index=True)
+    user_id: int = Field(foreign_key="users.id", index=True)
+    # Every token rotated from the same login shares a family, so reuse can revoke them all
+    family_id: str = Field(index=True)
+    created_at: datetime = Field(default_factory=utcnow)
+    expires_at: datetime
+    # Set when the token is exchanged; presenting it again means it leaked
+    used_at: Optional[datetime] = None
+    revoked: bool = False
@@ -1,15 +1,52 @@
 # task.py
+from datetime import datetime
 from typing import Optional, TYPE_CHECKING
+from sqlalchemy import Index, String
 from sqlmodel import Field, Relationship, SQLModel
 
+from ..lib.clock import utcnow
+
 if TYPE_CHECKING:
     from .user import User
 
+# Order keys from lib.ordering only sort correctly byte by byte, so Postgres must not apply a locale collation
+POSITION_TYPE = String().with_variant(String(collation="C"), "postgresql")
+
 class Task(SQLModel, table=True):
+    __table_args__ = (
+        # Keyset pagination walks (owner_id, id), so every page is an index range scan
+        Index("ix_task_owner_id_id", "owner_id", "id"),
+        # Delta sync reads everything an owner changed after a given version
+        Index("ix_task_owner_id_version", "owner_id", "version"),
+        Index("ix_task_deleted_updated_at", "deleted", "updated_at"),
+        # The archiver looks for live tasks completed before a cutoff
+        Index("ix_task_completed_updated_at", "completed", "updated_at"),
+        # Manual ordering lists by (owner_id, position) and finds a neighbour's next key in one probe
+        Index("ix_task_owner_id_position", "owner_id", "position"),
+        # The reminder scheduler reads only the next window of unsent reminders
+        Index("ix_task_reminded_remind_at", "reminded", "remind_at"),
+        # Archiving deletes rows, and SQLite would otherwise hand the highest id out again, so a
+        # restored task could collide with a newer one
+        {"sqlite_autoincrement": True},
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     description: Optional[str] = None
     completed: bool = False
+    # Fractional order key (lib.ordering): moving a task rewrites only its own key
+    position: Optional[str] = Field(default=None, sa_type=POSITION_TYPE)
+    due_at: Optional[datetime] = None
+    # lib.reminders sets reminded once it has notified; changing remind_at clears it
+    remind_at: Optional[datetime] = None
+    reminded: bool = False
+
+    # version is the owner's TaskRevision at the time of the last write
+    version: int = 0
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
+    # Deleted tasks stay behind as tombstones until compaction so delta sync can report them
+    deleted: bool = False
 
     owner_id: Optional[int] = Field(default=None, foreign_key="users.id")
     owner: Optional["User"] = Relationship(back_populates="tasks")
@@ -0,0 +1,17 @@
+# task_revision.py
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+
+from ..lib.clock import utcnow
+
+class TaskRevision(SQLModel, table=True):
+    __tablename__ = "task_revisions"
+    owner_id: int = Field(foreign_key="users.id", primary_key=True)
+    revision: int = 0
+    # Highest version whose tombstones were compacted away; older delta cursors must resync
+    compacted_version: int = 0
+    # Revisions start over when the row is recreated (a reset database, a reused user id), so ETags
+    # and cached list bodies key on this as well as on the revision
+    created_at: Optional[datetime] = Field(default_factory=utcnow)
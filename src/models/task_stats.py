@@ -0,0 +1,24 @@
+# task_stats.py
+from datetime import date, timedelta
+
+from sqlmodel import Field, SQLModel
+
+# "Created recently" covers today and the previous RECENT_DAYS - 1 days, by UTC date
+RECENT_DAYS = 7
+
+def recent_since(today: date) -> date:
+    return today - timedelta(days=RECENT_DAYS - 1)
+
+class TaskCounts(SQLModel, table=True):
+    # Live (non-deleted) tasks per owner, adjusted in the same transaction as every task write
+    __tablename__ = "task_counts"
+    owner_id: int = Field(foreign_key="users.id", primary_key=True)
+    total: int = 0
+    completed: int = 0
+
+class TaskDailyCount(SQLModel, table=True):
+    # Live tasks per owner by UTC creation date; days before the recent window are pruned
+    __tablename__ = "task_daily_counts"
+    owner_id: int = Field(foreign_key="users.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    created: int = 0
@@ -7,5 +7,7 @@ class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(unique=True, index=True)
     hashed_password: str
+    # Carried in access tokens as "ver"; revoking all sessions bumps it, so every token issued before stops working
+    token_version: int = 0
 
     tasks: List["Task"] = Relationship(back_populates="owner")
@@ -1,12 +1,15 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, SQLModel # Added SQLModel import
+from sqlmodel import SQLModel # Added SQLModel import
 
 from ..db import get_session
 from ..lib.jwt import create_access_token
+from ..lib.rate_limit import auth_throttle
+from ..middleware.jwt import get_current_user
 from ..models.user import User
+from ..services.session_service import SessionService
 from ..services.user_service import UserService
 
 router = APIRouter()
@@ -25,12 +28,17 @@ class UserCreate(SQLModel):
             raise ValueError("Password cannot be longer than 72 bytes")
         return v
 
+class RefreshRequest(SQLModel):
+    refresh_token: str
+
 @router.post("/signup", response_model=dict)
-def register_user(
-    user_data: UserCreate, user_service: Annotated[UserService, Depends()]
+async def register_user(
+    user_data: UserCreate, request: Request, user_service: Annotated[UserService, Depends()]
 ):
+    # Throttled before the duplicate-email query and the bcrypt hash
+    await auth_throttle.check("signup", request, user_data.email)
     try:
-        user_service.create_user(user_data.email, user_data.password)
+        await user_service.create_user(user_data.email, user_data.password)
         return {"message": "User created successfully"}
     except HTTPException as e:
         raise e
@@ -38,16 +46,43 @@ def register_user(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.post("/login", response_model=dict)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    user_service: Annotated[UserService, Depends()]
+    request: Request,
+    user_service: Annotated[UserService, Depends()],
+    session_service: Annotated[SessionService, Depends()],
 ):
-    user = user_service.authenticate_user(form_data.username, form_data.password)
+    # Throttled and lockout-checked before the user lookup and the bcrypt verify
+    await auth_throttle.check("login", request, form_data.username)
+    user = await user_service.authenticate_user(form_data.username, form_data.password)
     if not user:
+        await auth_throttle.login_failed(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": str(user.id)})
-    return {"access_token": access_token, "token_type": "bearer"}
+    await auth_throttle.login_succeeded(form_data.username)
+    access_token = create_access_token(data={"sub": str(user.id), "ver": user.token_version})
+    refresh_token = await session_service.issue(user.id)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+@router.post("/token/refresh", response_model=dict)
+async def refresh_access_token(
+    body: RefreshRequest,
+    session_service: Annotated[SessionService, Depends()],
+):
+    # One indexed lookup and an insert; the password is not checked again
+    user, refresh_token = await session_service.rotate(body.refresh_token)
+    access_token = create_access_token(data={"sub": str(user.id), "ver": user.token_version})
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+@router.post("/token/revoke-all", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_all_sessions(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session_service: Annotated[SessionService, Depends()],
+):
+    # Ends refresh tokens and access tokens alike; other workers may accept a cached access token
+    # for up to PRINCIPAL_CACHE_TTL_SECONDS more
+    await session_service.revoke_all(current_user.id)
+    return
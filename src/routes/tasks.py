@@ -1,27 +1,100 @@
-from typing import Annotated, List, Optional
+import asyncio
+import os
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, SQLModel # Added SQLModel import
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from pydantic import Field
+from sqlmodel import SQLModel # Added SQLModel import
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..db import get_session
-from ..middleware.jwt import get_current_user
+from ..db import get_read_session, get_session
+from ..lib.events import PING, task_events
+from ..lib.etag import etag_matches, revision_etag, task_list_cache
+from ..lib.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..lib.serialization import TaskJSONResponse, dump_tasks
+from ..lib.task_io import MEDIA_TYPES, export_row, format_csv, format_ndjson, parse_csv, parse_ndjson
+from ..middleware.jwt import authenticate_stream, get_current_user, get_stream_user
 from ..models.user import User
 from ..services.task_service import TaskService
 from ..models.task import Task
 
 router = APIRouter()
 
+TASK_BATCH_MAX_ITEMS = int(os.environ.get("TASK_BATCH_MAX_ITEMS", "500"))
+TASK_IMPORT_CHUNK_SIZE = int(os.environ.get("TASK_IMPORT_CHUNK_SIZE", str(TASK_BATCH_MAX_ITEMS)))
+
 class TaskCreate(SQLModel):
     title: str
     description: Optional[str] = None
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
 
 class TaskUpdate(SQLModel):
     title: Optional[str] = None
     description: Optional[str] = None
     completed: Optional[bool] = None
+    # Sending null clears these; leaving them out keeps them
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
+
+class TaskMove(SQLModel):
+    # The task lands after after_id and before before_id; with only one given it goes right next to it
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+class TaskBatchUpdateItem(TaskUpdate):
+    id: int
+
+class TaskBatchCreate(SQLModel):
+    items: List[TaskCreate] = Field(..., min_length=1, max_length=TASK_BATCH_MAX_ITEMS)
+
+class TaskBatchUpdate(SQLModel):
+    items: List[TaskBatchUpdateItem] = Field(..., min_length=1, max_length=TASK_BATCH_MAX_ITEMS)
+
+class TaskBatchComplete(SQLModel):
+    ids: List[int] = Field(..., min_length=1, max_length=TASK_BATCH_MAX_ITEMS)
+    completed: bool = True
+
+class TaskBatchDelete(SQLModel):
+    ids: List[int] = Field(..., min_length=1, max_length=TASK_BATCH_MAX_ITEMS)
+
+class TaskBatchItemResult(SQLModel):
+    id: Optional[int] = None
+    status: str
+    task: Optional[Task] = None
+
+class TaskBatchResult(SQLModel):
+    results: List[TaskBatchItemResult]
+
+class TaskChanges(SQLModel):
+    changes: List[Task]
+    version: int
+    has_more: bool
+
+class TaskStats(SQLModel):
+    total: int
+    completed: int
+    pending: int
+    created_last_7_days: int
+
+class TaskImportError(SQLModel):
+    line: int
+    error: str
+
+class TaskImportResult(SQLModel):
+    processed: int
+    imported: int
+    failed: int
+    errors: List[TaskImportError]
+
+def _batch_item(task_id: Optional[int], status: str, task: Optional[Task] = None):
+    # Same shape as TaskBatchItemResult, built without validating the trusted task row
+    return {"id": task_id, "status": status, "task": task}
 
 @router.post("/users/{user_id}/tasks", response_model=Task)
-def create_user_task(
+async def create_user_task(
     user_id: int,
     task_data: TaskCreate,
     current_user: Annotated[User, Depends(get_current_user)],
@@ -30,36 +103,223 @@ def create_user_task(
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to create tasks for this user")
     
-    return task_service.create_task(task_data.title, task_data.description, current_user.id)
+    return TaskJSONResponse(await task_service.create_task(
+        task_data.title,
+        task_data.description,
+        current_user.id,
+        task_data.due_at,
+        task_data.remind_at,
+    ))
 
 @router.get("/users/{user_id}/tasks", response_model=List[Task])
-def get_user_tasks(
+async def get_user_tasks(
     user_id: int,
+    request: Request,
     current_user: Annotated[User, Depends(get_current_user)],
-    task_service: Annotated[TaskService, Depends()]
+    task_service: Annotated[TaskService, Depends()],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    completed: Optional[bool] = None,
+    order: Literal["asc", "desc"] = "asc",
+    include_archived: bool = False,
+    sort: Literal["id", "position"] = "id",
 ):
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
     
-    return task_service.get_tasks(current_user.id)
+    # Polls with an unchanged revision are answered without touching the tasks table
+    revision = await task_service.get_revision(current_user.id)
+    etag = revision_etag(*revision)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # Every response is one bounded page; X-Next-Cursor is set while more remain
+    cache_key = (current_user.id, revision, limit, cursor, completed, order, include_archived, sort)
+    cached = task_list_cache.get(cache_key)
+    if cached is None:
+        tasks, next_cursor = await task_service.get_tasks(current_user.id, limit, cursor, completed, order, include_archived, sort)
+        cached = (dump_tasks(tasks), next_cursor)
+        task_list_cache.set(cache_key, cached, len(cached[0]))
+    body, next_cursor = cached
+
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return TaskJSONResponse(body, headers=headers)
+
+# Registered before /tasks/{task_id} so "search" and "changes" are not taken for task ids
+@router.get("/users/{user_id}/tasks/search", response_model=List[Task])
+async def search_user_tasks(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()],
+    q: Annotated[str, Query(min_length=1, max_length=256)],
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
+
+    tasks, next_cursor = await task_service.search_tasks(current_user.id, q, limit, cursor)
+    return TaskJSONResponse(dump_tasks(tasks), headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+@router.get("/users/{user_id}/tasks/export")
+async def export_user_tasks(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()],
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
+
+    async def body():
+        header = format == "csv"
+        async for tasks in task_service.stream_tasks(current_user.id):
+            rows = [export_row(task) for task in tasks]
+            yield format_csv(rows, header) if format == "csv" else format_ndjson(rows)
+            header = False
+        if header:
+            yield format_csv([], header)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'},
+    )
+
+@router.post("/users/{user_id}/tasks/import", response_model=TaskImportResult)
+async def import_user_tasks(
+    user_id: int,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()],
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to create tasks for this user")
+
+    # The body is parsed as it arrives and inserted in fixed-size chunks, never buffered whole
+    parse = parse_csv if format == "csv" else parse_ndjson
+    return await task_service.import_tasks(parse(request.stream()), current_user.id, TASK_IMPORT_CHUNK_SIZE)
+
+@router.get("/users/{user_id}/tasks/changes", response_model=TaskChanges)
+async def get_user_task_changes(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()],
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
+
+    changes, version, has_more = await task_service.get_changes(current_user.id, since, limit)
+    return TaskJSONResponse({"changes": changes, "version": version, "has_more": has_more})
+
+@router.get("/users/{user_id}/tasks/stats", response_model=TaskStats)
+async def get_user_task_stats(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()],
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
+
+    # Read from counters maintained by every write, so the cost does not grow with the list
+    return await task_service.get_stats(current_user.id)
+
+@router.get("/users/{user_id}/tasks/events")
+async def stream_user_task_events(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_stream_user)],
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
+
+    async def body():
+        # Subscribed before "ready" is sent, so a client that syncs on "ready" misses nothing
+        subscription = task_events.subscribe(current_user.id)
+        try:
+            async for message in subscription.messages():
+                yield b": ping\n\n" if message is None else b"data: " + message + b"\n\n"
+        finally:
+            task_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/users/{user_id}/tasks/events")
+async def user_task_events_socket(
+    websocket: WebSocket,
+    user_id: int,
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    token: Optional[str] = None,
+):
+    # Browsers cannot set headers on a WebSocket handshake, so the token may also come as ?token=
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        token = credentials
+    try:
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        current_user = await authenticate_stream(token, session)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if current_user.id != user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = task_events.subscribe(current_user.id)
+
+    async def send():
+        async for message in subscription.messages():
+            await websocket.send_text((PING if message is None else message).decode())
+
+    async def receive():
+        # Client messages are ignored; reading only notices the disconnect
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender, receiver = asyncio.create_task(send()), asyncio.create_task(receive())
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        task_events.unsubscribe(subscription)
+        for job in (sender, receiver):
+            job.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+    if receiver.cancelled():
+        # The stream ended on our side (slow consumer or shutdown); the client reconnects and resyncs
+        await websocket.close()
 
 @router.get("/users/{user_id}/tasks/{task_id}", response_model=Task)
-def get_user_task(
+async def get_user_task(
     user_id: int,
     task_id: int,
+    request: Request,
     current_user: Annotated[User, Depends(get_current_user)],
     task_service: Annotated[TaskService, Depends()]
 ):
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view tasks for this user")
     
-    task = task_service.get_task(task_id, current_user.id)
+    etag = revision_etag(*await task_service.get_revision(current_user.id))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    task = await task_service.get_task(task_id, current_user.id)
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    return task
+    return TaskJSONResponse(task, headers={"ETag": etag})
 
 @router.put("/users/{user_id}/tasks/{task_id}", response_model=Task)
-def update_user_task(
+async def update_user_task(
     user_id: int,
     task_id: int,
     task_data: TaskUpdate,
@@ -69,25 +329,17 @@ def update_user_task(
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
     
-    # Fetch current task to get existing title, description, completed status
-    existing_task = task_service.get_task(task_id, current_user.id)
-    if not existing_task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-
-    updated_title = task_data.title if task_data.title is not None else existing_task.title
-    updated_description = task_data.description if task_data.description is not None else existing_task.description
-    updated_completed = task_data.completed if task_data.completed is not None else existing_task.completed
-
-    return task_service.update_task(
-        task_id, 
-        current_user.id, 
-        updated_title, 
-        updated_description, 
-        updated_completed
-    )
+    return TaskJSONResponse(await task_service.update_task(
+        task_id,
+        current_user.id,
+        task_data.title,
+        task_data.description,
+        task_data.completed,
+        task_data.model_dump(include={"due_at", "remind_at"}, exclude_unset=True),
+    ))
 
 @router.patch("/users/{user_id}/tasks/{task_id}/complete", response_model=Task)
-def toggle_task_completion(
+async def toggle_task_completion(
     user_id: int,
     task_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
@@ -96,10 +348,36 @@ def toggle_task_completion(
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
     
-    return task_service.toggle_task_completion(task_id, current_user.id)
+    return TaskJSONResponse(await task_service.toggle_task_completion(task_id, current_user.id))
+
+@router.patch("/users/{user_id}/tasks/{task_id}/move", response_model=Task)
+async def move_user_task(
+    user_id: int,
+    task_id: int,
+    move: TaskMove,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
+
+    return TaskJSONResponse(await task_service.move_task(task_id, current_user.id, move.after_id, move.before_id))
+
+@router.post("/users/{user_id}/tasks/{task_id}/restore", response_model=Task)
+async def restore_user_task(
+    user_id: int,
+    task_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
+
+    # Moves an archived task back into the working set; other writes to it do this implicitly
+    return TaskJSONResponse(await task_service.restore_task(task_id, current_user.id))
 
 @router.delete("/users/{user_id}/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_task(
+async def delete_user_task(
     user_id: int,
     task_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
@@ -108,5 +386,78 @@ def delete_user_task(
     if current_user.id != user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete tasks for this user")
     
-    task_service.delete_task(task_id, current_user.id)
+    await task_service.delete_task(task_id, current_user.id)
     return
+
+@router.post("/users/{user_id}/tasks:batch/create", response_model=TaskBatchResult)
+async def create_user_tasks_batch(
+    user_id: int,
+    batch: TaskBatchCreate,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to create tasks for this user")
+
+    tasks = await task_service.create_tasks([item.model_dump() for item in batch.items], current_user.id)
+    return TaskJSONResponse({"results": [_batch_item(task.id, "created", task) for task in tasks]})
+
+@router.post("/users/{user_id}/tasks:batch/update", response_model=TaskBatchResult)
+async def update_user_tasks_batch(
+    user_id: int,
+    batch: TaskBatchUpdate,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
+
+    updated = await task_service.update_tasks([item.model_dump() for item in batch.items], current_user.id)
+    return TaskJSONResponse({"results": [
+        _batch_item(item.id, "updated", updated[item.id]) if item.id in updated else _batch_item(item.id, "not_found")
+        for item in batch.items
+    ]})
+
+@router.post("/users/{user_id}/tasks:batch/complete", response_model=TaskBatchResult)
+async def complete_user_tasks_batch(
+    user_id: int,
+    batch: TaskBatchComplete,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update tasks for this user")
+
+    updated = await task_service.set_tasks_completed(batch.ids, current_user.id, batch.completed)
+    return TaskJSONResponse({"results": [
+        _batch_item(task_id, "updated", updated[task_id]) if task_id in updated else _batch_item(task_id, "not_found")
+        for task_id in batch.ids
+    ]})
+
+@router.post("/users/{user_id}/tasks:batch/delete", response_model=TaskBatchResult)
+async def delete_user_tasks_batch(
+    user_id: int,
+    batch: TaskBatchDelete,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete tasks for this user")
+
+    deleted = set(await task_service.delete_tasks(batch.ids, current_user.id))
+    return TaskJSONResponse({"results": [
+        _batch_item(task_id, "deleted" if task_id in deleted else "not_found")
+        for task_id in batch.ids
+    ]})
+
+@router.post("/users/{user_id}/tasks:batch/clear-completed", response_model=TaskBatchResult)
+async def clear_completed_user_tasks(
+    user_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    task_service: Annotated[TaskService, Depends()]
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete tasks for this user")
+
+    deleted = await task_service.delete_completed_tasks(current_user.id)
+    return TaskJSONResponse({"results": [_batch_item(task_id, "deleted") for task_id in deleted]})
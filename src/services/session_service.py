@@ -0,0 +1,80 @@
+import hashlib
+import os
+import secrets
+import uuid
+from datetime import timedelta
+from typing import Annotated, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..db import get_session
+from ..lib.clock import utcnow
+from ..middleware.jwt import invalidate_user_principals
+from ..models.refresh_token import RefreshToken
+from ..models.user import User
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+def hash_refresh_token(token: str) -> str:
+    # Tokens are 256 random bits, so a fast hash is enough; bcrypt would bring back the cost refresh avoids
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionService:
+    def __init__(self, session: Annotated[AsyncSession, Depends(get_session)]):
+        self.session = session
+
+    async def issue(self, user_id: int, family_id: Optional[str] = None) -> str:
+        token = secrets.token_urlsafe(32)
+        self.session.add(RefreshToken(
+            token_hash=hash_refresh_token(token),
+            user_id=user_id,
+            family_id=family_id or uuid.uuid4().hex,
+            expires_at=utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        ))
+        await self.session.commit()
+        return token
+
+    async def rotate(self, token: str) -> Tuple[User, str]:
+        token_hash = hash_refresh_token(token)
+        now = utcnow()
+        # Checking and claiming the token is one statement, so two concurrent refreshes can't both succeed
+        claimed = (await self.session.exec(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.used_at == None,
+                RefreshToken.revoked == False,
+                RefreshToken.expires_at > now,
+            )
+            .values(used_at=now)
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+        )).first()
+        if claimed is None:
+            await self.session.rollback()
+            # An already exchanged token came back: someone holds a copy, so end the whole login
+            family_id = (await self.session.exec(
+                select(RefreshToken.family_id).where(RefreshToken.token_hash == token_hash, RefreshToken.used_at != None)
+            )).first()
+            if family_id is not None:
+                await self.session.exec(update(RefreshToken).where(RefreshToken.family_id == family_id).values(revoked=True))
+                await self.session.commit()
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user_id, family_id = claimed
+        user = await self.session.get(User, user_id)
+        return user, await self.issue(user_id, family_id)
+
+    async def revoke_all(self, user_id: int) -> int:
+        result = await self.session.exec(
+            update(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.revoked == False).values(revoked=True)
+        )
+        # Access tokens carry the version they were issued under; a new one rejects them all
+        await self.session.exec(update(User).where(User.id == user_id).values(token_version=User.token_version + 1))
+        await self.session.commit()
+        invalidate_user_principals(user_id)
+        return result.rowcount
@@ -0,0 +1,83 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, event, func, literal_column, or_, table, text
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from ..models.task import Task
+
+# SQLite: an external-content FTS5 table over task, kept in sync by triggers on every write path
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+        title, description, content='task', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_ad AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_fts_au AFTER UPDATE OF title, description ON task BEGIN
+        INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO task_fts(task_fts) VALUES ('rebuild')",
+]
+
+# Postgres: a generated tsvector column, so the database maintains it on every write
+POSTGRES_SEARCH_DDL = [
+    """ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_vector ON task USING GIN (search_vector)",
+]
+
+task_fts = table("task_fts", column("rowid"))
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+def install_search(connection):
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_SEARCH_DDL
+    elif connection.dialect.name == "sqlite":
+        statements = SQLITE_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+@event.listens_for(Task.__table__, "after_create")
+def _install_search_after_create(target, connection, **kw):
+    install_search(connection)
+
+def search_terms(query: str) -> List[str]:
+    return _TERM.findall(query.lower())
+
+def build_search_statement(dialect: str, owner_id: int, terms: List[str], after: Optional[Tuple[float, int]], limit: int):
+    # Every term must match, each as a prefix; lower rank sorts first on both backends
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        search_vector = literal_column("task.search_vector")
+        rank = (-func.ts_rank_cd(search_vector, tsquery)).label("rank")
+        ranked = select(Task, rank).where(search_vector.op("@@")(tsquery))
+    else:
+        match = " ".join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column("task_fts"), 10.0, 1.0).label("rank")
+        ranked = (
+            select(Task, rank)
+            .join_from(task_fts, Task, Task.id == task_fts.c.rowid)
+            .where(literal_column("task_fts").op("MATCH")(match))
+        )
+    ranked = ranked.where(Task.owner_id == owner_id, Task.deleted == False).subquery()
+
+    ranked_task = aliased(Task, ranked)
+    statement = select(ranked_task, ranked.c.rank)
+    if after is not None:
+        after_rank, after_id = after
+        statement = statement.where(or_(
+            ranked.c.rank > after_rank,
+            (ranked.c.rank == after_rank) & (ranked.c.id > after_id),
+        ))
+    return statement.order_by(ranked.c.rank.asc(), ranked.c.id.asc()).limit(limit)
@@ -1,59 +1,643 @@
-from typing import Annotated, List, Optional
+from collections import Counter
+from datetime import date, datetime
+from typing import Annotated, Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar, Union
 
 from fastapi import Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlalchemy import and_, func, literal, or_
+from sqlmodel import delete, insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..db import get_session
+from ..db import async_session_maker, dialect_insert, get_read_session, get_session
+from ..lib.clock import as_utc, naive_utc, utcnow
+from ..lib.events import task_events
+from ..jobs.positions import TASK_POSITION_MAX_LENGTH, request_rebalance
+from ..lib.group_commit import TASK_GROUP_COMMIT_MAX_OPS, TASK_GROUP_COMMIT_WINDOW_MS, GroupCommitter
+from ..lib.ordering import key_between, keys_after
+from ..lib.pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
+from ..models.archived_task import ARCHIVE_COLUMNS, ArchivedTask
 from ..models.task import Task
+from ..models.task_revision import TaskRevision
+from ..models.task_stats import TaskCounts, TaskDailyCount, recent_since
 from ..models.user import User
+from .task_search import build_search_statement, search_terms
+
+T = TypeVar("T")
+
+def _schedule_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    # Stored as UTC like every other timestamp; a new reminder time has not been sent yet
+    values = {k: naive_utc(v) if k in ("due_at", "remind_at") and v is not None else v for k, v in values.items()}
+    if "remind_at" in values:
+        values["reminded"] = False
+    return values
+
+# Started from the lifespan hook when TASK_GROUP_COMMIT is set; single-task writes go through it while it runs
+task_writes = GroupCommitter(async_session_maker, TASK_GROUP_COMMIT_WINDOW_MS / 1000, TASK_GROUP_COMMIT_MAX_OPS)
 
 class TaskService:
-    def __init__(self, session: Annotated[Session, Depends(get_session)]):
+    def __init__(
+        self,
+        session: Annotated[AsyncSession, Depends(get_session)],
+        read_session: Annotated[AsyncSession, Depends(get_read_session)],
+    ):
         self.session = session
+        # Reads may be served by a replica; writes and the reads they depend on use session
+        self.read_session = read_session
+        # Events of the current write, published once it commits
+        self._events: List[Tuple[int, int, List[Task]]] = []
+
+    async def create_task(
+        self,
+        title: str,
+        description: Optional[str],
+        owner_id: int,
+        due_at: Optional[datetime] = None,
+        remind_at: Optional[datetime] = None,
+    ) -> Task:
+        schedule = _schedule_values({"due_at": due_at, "remind_at": remind_at})
+        return await self._write(owner_id, lambda service: service._create_task(title, description, owner_id, schedule))
 
-    def create_task(self, title: str, description: Optional[str], owner_id: int) -> Task:
-        task = Task(title=title, description=description, owner_id=owner_id)
+    async def _create_task(self, title: str, description: Optional[str], owner_id: int, schedule: Dict[str, Any]) -> Task:
+        revision = await self._next_revision(owner_id)
+        # New tasks go to the end of the manual order
+        position = key_between(await self._last_position(owner_id), None)
+        task = Task(title=title, description=description, owner_id=owner_id, version=revision, position=position, **schedule)
         self.session.add(task)
-        self.session.commit()
-        self.session.refresh(task)
+        await self._adjust_counts(owner_id, total=1, created={task.created_at.date(): 1})
+        await self.session.flush()
+        self._events.append((owner_id, revision, [task]))
         return task
 
-    def get_tasks(self, owner_id: int) -> List[Task]:
-        tasks = self.session.exec(select(Task).where(Task.owner_id == owner_id)).all()
-        return tasks
+    async def get_tasks(
+        self,
+        owner_id: int,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        completed: Optional[bool] = None,
+        order: str = "asc",
+        include_archived: bool = False,
+        sort: str = "id",
+    ) -> Tuple[List[Task], Optional[str]]:
+        after = decode_cursor(cursor)
+        if after is not None and (
+            after.get("o") != order
+            or not isinstance(after.get("id"), int)
+            or after.get("s", "id") != sort
+            or (sort == "position" and not isinstance(after.get("p"), str))
+        ):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        after_key = (after.get("p"), after["id"]) if after is not None else None
+
+        # Fetch one extra row to learn whether another page exists
+        fetch = limit + 1
+        tasks = list((await self.read_session.exec(self._page_statement(Task, owner_id, completed, order, sort, after_key, fetch))).all())
+        # Archived tasks are all completed, so a completed=false page never needs the archive
+        if include_archived and completed is not False:
+            archived = (await self.read_session.exec(self._page_statement(ArchivedTask, owner_id, completed, order, sort, after_key, fetch))).all()
+            # Both pages are in sort order; their merged head is the combined page
+            tasks = sorted(tasks + [task.to_task() for task in archived], key=self._sort_key(sort), reverse=order == "desc")[:fetch]
+
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            last = tasks[-1]
+            next_cursor = encode_cursor({"id": last.id, "o": order} if sort == "id" else {"p": last.position or "", "id": last.id, "o": order, "s": sort})
+        return tasks, next_cursor
+
+    @staticmethod
+    def _sort_key(sort: str) -> Callable[[Task], Any]:
+        if sort == "position":
+            # Keys are unique per owner; the id only makes the order total
+            return lambda task: (task.position or "", task.id)
+        return lambda task: task.id
+
+    @staticmethod
+    def _page_statement(model, owner_id: int, completed: Optional[bool], order: str, sort: str, after_key: Optional[Tuple[Optional[str], int]], limit: int):
+        statement = select(model).where(model.owner_id == owner_id, model.deleted == False)
+        if completed is not None:
+            statement = statement.where(model.completed == completed)
+        columns = (model.position, model.id) if sort == "position" else (model.id,)
+        if after_key is not None:
+            position, after_id = after_key
+            if sort == "position":
+                past = model.position < position if order == "desc" else model.position > position
+                same = and_(model.position == position, model.id < after_id if order == "desc" else model.id > after_id)
+                statement = statement.where(or_(past, same))
+            else:
+                statement = statement.where(model.id < after_id if order == "desc" else model.id > after_id)
+        # (owner_id, id) and (owner_id, position) indexes make each page a range scan
+        statement = statement.order_by(*[column.desc() if order == "desc" else column.asc() for column in columns])
+        return statement.limit(limit)
+
+    async def search_tasks(
+        self,
+        owner_id: int,
+        query: str,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Task], Optional[str]]:
+        terms = search_terms(query)
+        if not terms:
+            return [], None
+
+        after = decode_cursor(cursor)
+        if after is not None:
+            if after.get("q") != query or not isinstance(after.get("r"), (int, float)) or not isinstance(after.get("id"), int):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            after = (after["r"], after["id"])
+
+        statement = build_search_statement(self.read_session.bind.dialect.name, owner_id, terms, after, limit + 1)
+        rows = (await self.read_session.exec(statement)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_task, last_rank = rows[-1]
+            next_cursor = encode_cursor({"r": last_rank, "id": last_task.id, "q": query})
+        return [task for task, _ in rows], next_cursor
 
-    def get_task(self, task_id: int, owner_id: int) -> Optional[Task]:
-        task = self.session.exec(select(Task).where(Task.id == task_id, Task.owner_id == owner_id)).first()
+    async def get_task(self, task_id: int, owner_id: int) -> Optional[Task]:
+        task = (await self.read_session.exec(select(Task).where(Task.id == task_id, Task.owner_id == owner_id, Task.deleted == False))).first()
+        if task is None:
+            # Only misses pay for the archive lookup
+            archived = (await self.read_session.exec(select(ArchivedTask).where(ArchivedTask.id == task_id, ArchivedTask.owner_id == owner_id))).first()
+            task = archived.to_task() if archived else None
         return task
 
-    def update_task(self, task_id: int, owner_id: int, title: str, description: Optional[str], completed: bool) -> Task:
-        task = self.get_task(task_id, owner_id)
+    async def get_stats(self, owner_id: int) -> Dict[str, int]:
+        counts = (await self.read_session.exec(select(TaskCounts).where(TaskCounts.owner_id == owner_id))).first()
+        recent = (await self.read_session.exec(
+            select(func.coalesce(func.sum(TaskDailyCount.created), 0))
+            .where(TaskDailyCount.owner_id == owner_id, TaskDailyCount.day >= recent_since(utcnow().date()))
+        )).one()
+        total, completed = (counts.total, counts.completed) if counts else (0, 0)
+        return {"total": total, "completed": completed, "pending": total - completed, "created_last_7_days": recent}
+
+    async def get_revision(self, owner_id: int) -> Tuple[int, int]:
+        # (revision, epoch): the epoch tells a recreated revision row apart from the one it replaced
+        row = (await self.read_session.exec(
+            select(TaskRevision.revision, TaskRevision.created_at).where(TaskRevision.owner_id == owner_id)
+        )).first()
+        if row is None:
+            return 0, 0
+        revision, created_at = row
+        return revision, int(as_utc(created_at).timestamp() * 1_000_000) if created_at else 0
+
+    async def get_changes(self, owner_id: int, since: int, limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Task], int, bool]:
+        state = (await self.read_session.exec(select(TaskRevision).where(TaskRevision.owner_id == owner_id))).first()
+        if state is None:
+            # No write since the upgrade: whatever versions the migrations gave the owner's rows are current
+            revision = (await self.read_session.exec(select(func.coalesce(func.max(Task.version), 0)).where(Task.owner_id == owner_id))).one()
+            state = TaskRevision(owner_id=owner_id, revision=revision)
+        # since=0 is a full sync and never needs the compacted tombstones
+        if 0 < since < state.compacted_version:
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Changes since this version were compacted; resync the full list")
+
+        # Archived tasks are not part of the sync set: a full sync (since=0) returns the working set, like the
+        # default list, and archiving a task emits no change. They reappear with a new version once restored
+        # or written to; clients that want them read the list with include_archived=true
+        # Versions up to the revision read above are all committed, so the high-water mark never skips a write
+        statement = (
+            select(Task)
+            .where(Task.owner_id == owner_id, Task.version > since, Task.version <= state.revision)
+            .order_by(Task.version.asc(), Task.id.asc())
+        )
+        changes = list((await self.read_session.exec(statement.limit(limit + 1))).all())
+        if len(changes) <= limit:
+            return changes, state.revision, False
+
+        # A batch shares one version; finish the boundary version so the cursor lands between versions
+        changes = changes[:limit]
+        last = changes[-1]
+        rest = await self.read_session.exec(
+            select(Task)
+            .where(Task.owner_id == owner_id, Task.version == last.version, Task.id > last.id)
+            .order_by(Task.id.asc())
+        )
+        changes.extend(rest.all())
+        return changes, last.version, True
+
+    async def update_task(
+        self,
+        task_id: int,
+        owner_id: int,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        completed: Optional[bool] = None,
+        schedule: Optional[Dict[str, Optional[datetime]]] = None,
+    ) -> Task:
+        values = {k: v for k, v in {"title": title, "description": description, "completed": completed}.items() if v is not None}
+        # due_at and remind_at are passed only when given, so None clears them
+        values.update(_schedule_values(schedule or {}))
+        if not values:
+            task = await self.get_task(task_id, owner_id)
+            if not task:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+            return task
+        return await self._write(owner_id, lambda service: service._update_returning(task_id, owner_id, values))
+
+    async def toggle_task_completion(self, task_id: int, owner_id: int) -> Task:
+        # Flipping in SQL keeps concurrent toggles from racing on a read-modify-write
+        return await self._write(owner_id, lambda service: service._update_returning(task_id, owner_id, {"completed": ~Task.completed}))
+
+    async def move_task(self, task_id: int, owner_id: int, after_id: Optional[int], before_id: Optional[int]) -> Task:
+        if after_id is None and before_id is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give after_id, before_id or both")
+        if task_id in (after_id, before_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A task cannot be its own neighbour")
+        return await self._write(owner_id, lambda service: service._move_task(task_id, owner_id, after_id, before_id))
+
+    async def _move_task(self, task_id: int, owner_id: int, after_id: Optional[int], before_id: Optional[int]) -> Task:
+        revision = await self._next_revision(owner_id)
+        low = await self._neighbour_position(after_id, owner_id) if after_id is not None else None
+        high = await self._neighbour_position(before_id, owner_id) if before_id is not None else None
+        # With one neighbour given, the other side is whatever sits next to it now
+        if before_id is None:
+            high = await self._adjacent_position(owner_id, task_id, low, after=True)
+        elif after_id is None:
+            low = await self._adjacent_position(owner_id, task_id, high, after=False)
+        if low is not None and high is not None and low >= high:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="after_id must come before before_id")
+        # Only the moved task's key changes, however long the list
+        position = key_between(low, high)
+        if len(position) > TASK_POSITION_MAX_LENGTH:
+            request_rebalance(owner_id)
+        return await self._update_task(task_id, owner_id, {"position": position}, revision)
+
+    async def _neighbour_position(self, task_id: int, owner_id: int) -> str:
+        for model in (Task, ArchivedTask):
+            position = (await self.session.exec(
+                select(model.position).where(model.id == task_id, model.owner_id == owner_id, model.deleted == False)
+            )).first()
+            if position is not None:
+                return position
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Neighbour task not found")
+
+    async def _adjacent_position(self, owner_id: int, task_id: int, position: str, after: bool) -> Optional[str]:
+        # The nearest key on one side, from both tables so archived tasks keep their place; each
+        # lookup is one probe of the (owner_id, position) index
+        nearest = None
+        for model in (Task, ArchivedTask):
+            key = (await self.session.exec(
+                select(func.min(model.position) if after else func.max(model.position))
+                .where(
+                    model.owner_id == owner_id,
+                    model.deleted == False,
+                    model.id != task_id,
+                    model.position > position if after else model.position < position,
+                )
+            )).one()
+            if key is not None and (nearest is None or (key < nearest if after else key > nearest)):
+                nearest = key
+        return nearest
+
+    async def _last_position(self, owner_id: int) -> Optional[str]:
+        # Archived tasks keep their keys, so new tasks must sort after those too
+        last = None
+        for model in (Task, ArchivedTask):
+            key = (await self.session.exec(select(func.max(model.position)).where(model.owner_id == owner_id))).one()
+            if key is not None and (last is None or key > last):
+                last = key
+        return last
+
+    async def _new_positions(self, owner_id: int, requested: List[Optional[str]]) -> List[str]:
+        # Requested keys (from an import) are kept when no other task of the owner holds them, so restoring
+        # a backup into an empty list reproduces its order. The rest go after every key in use, kept ones included
+        wanted = {key for key in requested if key is not None and len(key) <= TASK_POSITION_MAX_LENGTH}
+        taken = set()
+        if wanted:
+            for model in (Task, ArchivedTask):
+                statement = select(model.position).where(model.owner_id == owner_id, model.position.in_(wanted))
+                taken.update((await self.session.exec(statement)).all())
+        kept = []
+        for key in requested:
+            if key in wanted and key not in taken:
+                taken.add(key)
+                kept.append(key)
+            else:
+                kept.append(None)
+        last = await self._last_position(owner_id)
+        for key in kept:
+            if key is not None and (last is None or key > last):
+                last = key
+        appended = iter(keys_after(last, kept.count(None)))
+        return [key if key is not None else next(appended) for key in kept]
+
+    async def delete_task(self, task_id: int, owner_id: int):
+        await self._write(owner_id, lambda service: service._delete_task(task_id, owner_id))
+
+    async def restore_task(self, task_id: int, owner_id: int) -> Task:
+        return await self._write(owner_id, lambda service: service._restore_task(task_id, owner_id))
+
+    async def _restore_task(self, task_id: int, owner_id: int) -> Task:
+        revision = await self._next_revision(owner_id)
+        restored = await self._unarchive(revision, ArchivedTask.id == task_id, ArchivedTask.owner_id == owner_id)
+        task = (await self.session.exec(select(Task).where(Task.id == task_id, Task.owner_id == owner_id, Task.deleted == False))).first()
         if not task:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        
-        task.title = title
-        task.description = description
-        task.completed = completed
-        self.session.add(task)
-        self.session.commit()
-        self.session.refresh(task)
+        # Restoring a task that is already in the working set changes nothing
+        if restored:
+            self._events.append((owner_id, revision, [task]))
         return task
 
-    def toggle_task_completion(self, task_id: int, owner_id: int) -> Task:
-        task = self.get_task(task_id, owner_id)
-        if not task:
+    async def _delete_task(self, task_id: int, owner_id: int):
+        revision = await self._next_revision(owner_id)
+        deleted = await self._tombstone(revision, Task.id == task_id, Task.owner_id == owner_id)
+        if not deleted and await self._unarchive(revision, ArchivedTask.id == task_id, ArchivedTask.owner_id == owner_id):
+            deleted = await self._tombstone(revision, Task.id == task_id, Task.owner_id == owner_id)
+        if not deleted:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        
-        task.completed = not task.completed
-        self.session.add(task)
-        self.session.commit()
-        self.session.refresh(task)
-        return task
+        await self._count_deleted(owner_id, deleted)
+        self._events.append((owner_id, revision, deleted))
+
+    async def _write(self, owner_id: int, operation: Callable[["TaskService"], Awaitable[T]]) -> T:
+        # operation stages a write to owner_id's tasks without committing; the commit is either our own
+        # or a shared group commit, and an error undoes the write (the revision bump included) either way
+        if task_writes.running:
+            async def staged(session: AsyncSession):
+                service = TaskService(session, session)
+                return await operation(service), service._events
+            result, events = await task_writes.submit(staged, key=owner_id)
+        else:
+            try:
+                result = await operation(self)
+            except BaseException:
+                await self.session.rollback()
+                raise
+            await self.session.commit()
+            events, self._events = self._events, []
+        for owner_id, revision, tasks in events:
+            await task_events.publish(owner_id, revision, tasks)
+        return result
 
-    def delete_task(self, task_id: int, owner_id: int):
-        task = self.get_task(task_id, owner_id)
+    async def _update_returning(self, task_id: int, owner_id: int, values: Dict[str, Any]) -> Task:
+        return await self._update_task(task_id, owner_id, values, await self._next_revision(owner_id))
+
+    async def _update_task(self, task_id: int, owner_id: int, values: Dict[str, Any], revision: int) -> Task:
+        task = await self._apply_update(task_id, owner_id, values, revision)
+        # Writing to an archived task brings it back into the working set first
+        if not task and await self._unarchive(revision, ArchivedTask.id == task_id, ArchivedTask.owner_id == owner_id):
+            task = await self._apply_update(task_id, owner_id, values, revision)
         if not task:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        
-        self.session.delete(task)
-        self.session.commit()
+        self._events.append((owner_id, revision, [task]))
+        return task
+
+    async def _apply_update(self, task_id: int, owner_id: int, values: Dict[str, Any], revision: int) -> Optional[Task]:
+        was_completed = None
+        if isinstance(values.get("completed"), bool):
+            # The revision row lock above orders this owner's writes, so the value can't change before the update
+            was_completed = (await self.session.exec(
+                select(Task.completed).where(Task.id == task_id, Task.owner_id == owner_id, Task.deleted == False)
+            )).first()
+        statement = (
+            update(Task)
+            .where(Task.id == task_id, Task.owner_id == owner_id, Task.deleted == False)
+            .values(**values, version=revision, updated_at=utcnow())
+            .returning(Task)
+            .execution_options(synchronize_session=False)
+        )
+        task = (await self.session.exec(statement)).scalars().first()
+        # A toggle always flips; an explicit value only counts when it differs
+        if task and "completed" in values and task.completed != was_completed:
+            await self._adjust_counts(owner_id, completed=1 if task.completed else -1)
+        return task
+
+    async def create_tasks(self, items: List[Dict[str, Any]], owner_id: int) -> List[Task]:
+        if not items:
+            return []
+        revision = await self._next_revision(owner_id)
+        now = utcnow()
+        positions = await self._new_positions(owner_id, [item.get("position") for item in items])
+        rows = [
+            {
+                "title": item["title"],
+                "description": item.get("description"),
+                "completed": bool(item.get("completed", False)),
+                "position": position,
+                **_schedule_values({"due_at": item.get("due_at"), "remind_at": item.get("remind_at")}),
+                # An imported reminder that already went out is not sent again
+                "reminded": bool(item.get("reminded")) and item.get("remind_at") is not None,
+                "owner_id": owner_id,
+                "version": revision,
+                # Imports carry the original creation time
+                "created_at": naive_utc(item["created_at"]) if item.get("created_at") else now,
+                "updated_at": now,
+            }
+            for item, position in zip(items, positions)
+        ]
+        statement = insert(Task).returning(Task, sort_by_parameter_order=True)
+        tasks = (await self.session.exec(statement, params=rows)).scalars().all()
+        since = recent_since(now.date())
+        created = Counter(row["created_at"].date() for row in rows if row["created_at"].date() >= since)
+        await self._adjust_counts(owner_id, total=len(rows), completed=sum(row["completed"] for row in rows), created=created)
+        await self.session.commit()
+        await task_events.publish(owner_id, revision, tasks)
+        return tasks
+
+    async def stream_tasks(self, owner_id: int, batch_size: int = 500) -> AsyncIterator[List[Task]]:
+        # Server-side cursor: rows arrive batch_size at a time instead of being materialized up front
+        statement = (
+            select(Task)
+            .where(Task.owner_id == owner_id, Task.deleted == False)
+            .order_by(Task.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.read_session.stream(statement)
+        async for partition in result.scalars().partitions():
+            yield partition
+        # An export is the user's whole list, archived tasks included
+        archived = await self.read_session.stream(
+            select(ArchivedTask)
+            .where(ArchivedTask.owner_id == owner_id)
+            .order_by(ArchivedTask.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in archived.scalars().partitions():
+            yield [task.to_task() for task in partition]
+
+    async def import_tasks(
+        self,
+        rows: AsyncIterable[Tuple[int, Union[Dict[str, Any], str]]],
+        owner_id: int,
+        chunk_size: int,
+        max_errors: int = 100,
+    ) -> Dict[str, Any]:
+        processed, imported, errors = 0, 0, []
+        chunk: List[Dict[str, Any]] = []
+        async for line, item in rows:
+            processed += 1
+            if isinstance(item, str):
+                if len(errors) < max_errors:
+                    errors.append({"line": line, "error": item})
+                continue
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                imported += len(await self.create_tasks(chunk, owner_id))
+                chunk = []
+        if chunk:
+            imported += len(await self.create_tasks(chunk, owner_id))
+        return {"processed": processed, "imported": imported, "failed": processed - imported, "errors": errors}
+
+    async def update_tasks(self, items: List[Dict[str, Any]], owner_id: int) -> Dict[int, Task]:
+        ids = {item["id"] for item in items}
+        # Later items win when the same id appears twice
+        changes: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            changes.setdefault(item["id"], {}).update(_schedule_values({k: v for k, v in item.items() if k != "id" and v is not None}))
+        written = [task_id for task_id, values in changes.items() if values]
+        # Taken before reading, so ownership and completed flags cannot change under the update
+        revision = await self._next_revision(owner_id)
+        # Writing to an archived task brings it back into the working set first, as single-task writes do
+        if written:
+            await self._unarchive(revision, ArchivedTask.id.in_(written), ArchivedTask.owner_id == owner_id)
+        owned = dict((await self.session.exec(
+            select(Task.id, Task.completed).where(Task.owner_id == owner_id, Task.id.in_(ids), Task.deleted == False)
+        )).all())
+        rows = [{"id": task_id, **changes[task_id]} for task_id in written if task_id in owned]
+        if not rows:
+            # Nothing to write: release the lock without bumping the revision, and answer like get_task
+            await self.session.rollback()
+            return await self._find_tasks(ids, owner_id)
+        now = utcnow()
+        for row in rows:
+            row.update(version=revision, updated_at=now)
+        # Bulk UPDATE by primary key runs as executemany; ownership was checked above
+        await self.session.exec(update(Task), params=rows)
+        completed = sum(int(row["completed"]) - int(owned[row["id"]]) for row in rows if "completed" in row)
+        await self._adjust_counts(owner_id, completed=completed)
+        tasks = (await self.session.exec(select(Task).where(Task.id.in_(owned)))).all()
+        await self.session.commit()
+        await task_events.publish(owner_id, revision, [task for task in tasks if task.version == revision])
+        found = {task.id: task for task in tasks}
+        # Items without changes for archived tasks are left in the archive
+        found.update(await self._find_tasks(ids - set(found), owner_id))
+        return found
+
+    async def _find_tasks(self, task_ids: Set[int], owner_id: int) -> Dict[int, Task]:
+        if not task_ids:
+            return {}
+        found = {task.id: task for task in (await self.session.exec(
+            select(Task).where(Task.owner_id == owner_id, Task.id.in_(task_ids), Task.deleted == False)
+        )).all()}
+        missing = task_ids - set(found)
+        if missing:
+            # Only misses pay for the archive lookup
+            for archived in (await self.session.exec(
+                select(ArchivedTask).where(ArchivedTask.owner_id == owner_id, ArchivedTask.id.in_(missing))
+            )).all():
+                found[archived.id] = archived.to_task()
+        return found
+
+    async def set_tasks_completed(self, task_ids: List[int], owner_id: int, completed: bool) -> Dict[int, Task]:
+        revision = await self._next_revision(owner_id)
+        await self._unarchive(revision, ArchivedTask.id.in_(set(task_ids)), ArchivedTask.owner_id == owner_id)
+        flipped = (await self.session.exec(
+            select(func.count()).where(
+                Task.owner_id == owner_id, Task.id.in_(set(task_ids)), Task.deleted == False, Task.completed != completed
+            )
+        )).one()
+        statement = (
+            update(Task)
+            .where(Task.owner_id == owner_id, Task.id.in_(set(task_ids)), Task.deleted == False)
+            .values(completed=completed, version=revision, updated_at=utcnow())
+            .returning(Task)
+            .execution_options(synchronize_session=False)
+        )
+        tasks = (await self.session.exec(statement)).scalars().all()
+        await self._adjust_counts(owner_id, completed=flipped if completed else -flipped)
+        await self._commit(owner_id, revision, tasks)
+        return {task.id: task for task in tasks}
+
+    async def delete_tasks(self, task_ids: List[int], owner_id: int) -> List[int]:
+        revision = await self._next_revision(owner_id)
+        # Archived tasks come back only to be tombstoned, so sync clients drop them
+        await self._unarchive(revision, ArchivedTask.id.in_(set(task_ids)), ArchivedTask.owner_id == owner_id)
+        deleted = await self._tombstone(revision, Task.owner_id == owner_id, Task.id.in_(set(task_ids)))
+        await self._count_deleted(owner_id, deleted)
+        await self._commit(owner_id, revision, deleted)
+        return [task.id for task in deleted]
+
+    async def delete_completed_tasks(self, owner_id: int) -> List[int]:
+        revision = await self._next_revision(owner_id)
+        # Archived tasks are completed too; they come back only to be tombstoned, so sync clients drop them
+        await self._unarchive(revision, ArchivedTask.owner_id == owner_id)
+        deleted = await self._tombstone(revision, Task.owner_id == owner_id, Task.completed == True)
+        await self._count_deleted(owner_id, deleted)
+        await self._commit(owner_id, revision, deleted)
+        return [task.id for task in deleted]
+
+    async def _unarchive(self, revision: int, *criteria) -> int:
+        # Moves archived rows back unchanged apart from the new version, so delta sync reports them
+        columns = [column for column in ARCHIVE_COLUMNS if column not in ("version", "updated_at")]
+        moved = (await self.session.exec(
+            insert(Task).from_select(
+                columns + ["version", "updated_at"],
+                select(*[getattr(ArchivedTask, column) for column in columns], literal(revision), literal(utcnow(), type_=Task.__table__.c.updated_at.type))
+                .where(*criteria),
+            )
+        )).rowcount
+        if moved:
+            await self.session.exec(delete(ArchivedTask).where(*criteria))
+        return moved
+
+    async def _tombstone(self, revision: int, *criteria) -> List[Task]:
+        # Deletes keep the row as a tombstone so delta sync can report it; see jobs.tombstones
+        statement = (
+            update(Task)
+            .where(*criteria, Task.deleted == False)
+            .values(deleted=True, version=revision, updated_at=utcnow())
+            .returning(Task)
+            .execution_options(synchronize_session=False)
+        )
+        return (await self.session.exec(statement)).scalars().all()
+
+    async def _count_deleted(self, owner_id: int, deleted: List[Task]):
+        # Days before the recent window have been pruned and no longer matter
+        since = recent_since(utcnow().date())
+        created = Counter(task.created_at.date() for task in deleted if task.created_at.date() >= since)
+        await self._adjust_counts(
+            owner_id,
+            total=-len(deleted),
+            completed=-sum(task.completed for task in deleted),
+            created={day: -count for day, count in created.items()},
+        )
+
+    async def _adjust_counts(self, owner_id: int, total: int = 0, completed: int = 0, created: Optional[Dict[date, int]] = None):
+        # Runs inside the write's transaction, so the counters commit or roll back with it
+        if total or completed:
+            await self.session.exec(
+                dialect_insert(self.session, TaskCounts)
+                .values(owner_id=owner_id, total=total, completed=completed)
+                .on_conflict_do_update(
+                    index_elements=[TaskCounts.owner_id],
+                    set_={"total": TaskCounts.total + total, "completed": TaskCounts.completed + completed},
+                )
+            )
+        for day, count in (created or {}).items():
+            await self.session.exec(
+                dialect_insert(self.session, TaskDailyCount)
+                .values(owner_id=owner_id, day=day, created=count)
+                .on_conflict_do_update(
+                    index_elements=[TaskDailyCount.owner_id, TaskDailyCount.day],
+                    set_={"created": TaskDailyCount.created + count},
+                )
+            )
+
+    async def _next_revision(self, owner_id: int) -> int:
+        # Every write bumps the owner's revision in its own transaction; the row lock also
+        # orders concurrent writes for the same owner
+        statement = (
+            dialect_insert(self.session, TaskRevision)
+            .values(owner_id=owner_id, revision=1, created_at=utcnow())
+            .on_conflict_do_update(index_elements=[TaskRevision.owner_id], set_={"revision": TaskRevision.revision + 1})
+            .returning(TaskRevision.revision)
+        )
+        return (await self.session.exec(statement)).scalar_one()
+
+    async def _commit(self, owner_id: int, revision: int, changed: List[Task]):
+        # Roll back no-op writes so the revision (and with it every client's ETag) stays put
+        if changed:
+            await self.session.commit()
+            await task_events.publish(owner_id, revision, changed)
+        else:
+            await self.session.rollback()
@@ -1,30 +1,39 @@
 from typing import Annotated, Optional
 
 from fastapi import Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..db import get_session
-from ..lib.security import get_password_hash, verify_password
+from ..lib.security import get_password_hash_async, verify_and_update_password
 from ..models.user import User
 
 class UserService:
-    def __init__(self, session: Annotated[Session, Depends(get_session)]):
+    def __init__(self, session: Annotated[AsyncSession, Depends(get_session)]):
         self.session = session
 
-    def create_user(self, email: str, password: str) -> User:
-        user = self.session.exec(select(User).where(User.email == email)).first()
+    async def create_user(self, email: str, password: str) -> User:
+        user = (await self.session.exec(select(User).where(User.email == email))).first()
         if user:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
-        hashed_password = get_password_hash(password)
+        hashed_password = await get_password_hash_async(password)
         user = User(email=email, hashed_password=hashed_password)
         self.session.add(user)
-        self.session.commit()
-        self.session.refresh(user)
+        await self.session.commit()
+        await self.session.refresh(user)
         return user
 
-    def authenticate_user(self, email: str, password: str) -> Optional[User]:
-        user = self.session.exec(select(User).where(User.email == email)).first()
-        if not user or not verify_password(password, user.hashed_password):
+    async def authenticate_user(self, email: str, password: str) -> Optional[User]:
+        user = (await self.session.exec(select(User).where(User.email == email))).first()
+        if not user:
             return None
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            # The stored hash used a different bcrypt cost than BCRYPT_ROUNDS; upgrade it in place
+            user.hashed_password = new_hash
+            self.session.add(user)
+            await self.session.commit()
         return user
@@ -0,0 +1,68 @@
+import os
+
+# The app builds its engines at import time; point them at the test database so the lifespan
+# hook, background jobs and websocket auth all use the same file as the tests
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("DB_POOL_PREWARM", "0")
+os.environ.setdefault("BETTER_AUTH_SECRET", "test-secret")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("METRICS_TOKEN", "test-metrics-token")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db import get_read_session, get_session
+from src.lib.etag import task_list_cache
+from src.lib.rate_limit import auth_throttle
+from src.lib.security import get_password_hash
+from src.main import app
+from src.models.user import User
+
+TEST_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(TEST_DATABASE_URL)
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+def drop_db_and_tables():
+    SQLModel.metadata.drop_all(engine)
+
+async def get_session_override():
+    async with async_session_maker() as session:
+        yield session
+
+app.dependency_overrides[get_session] = get_session_override
+app.dependency_overrides[get_read_session] = get_session_override
+
+@pytest.fixture(autouse=True)
+def reset_auth_throttle():
+    # Every test logs in from the same client address
+    auth_throttle.backend.reset()
+
+@pytest.fixture(name="client")
+def client_fixture():
+    drop_db_and_tables()
+    create_db_and_tables()
+    # Bodies cached for the previous test's database
+    task_list_cache.clear()
+    with TestClient(app) as client:
+        yield client
+    drop_db_and_tables()
+
+@pytest.fixture(name="session")
+def session_fixture(client: TestClient):
+    with Session(engine) as session:
+        yield session
+
+@pytest.fixture(name="test_user")
+def test_user_fixture(client: TestClient, session: Session):
+    user = User(email="test@example.com", hashed_password=get_password_hash("testpassword"))
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
@@ -1,43 +1,17 @@
-import pytest
+import json
 from fastapi.testclient import TestClient
-from sqlmodel import Session, create_engine, SQLModel
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from backend.src.main import app, get_session
-from backend.src.models.user import User
-from backend.src.models.task import Task
-from backend.src.lib.security import get_password_hash
+from src.main import app
+from src.models.user import User
+from src.models.task import Task
+from src.models.archived_task import ArchivedTask
+from src.models.task_revision import TaskRevision
+from src.lib.serialization import dump_tasks
 
-# Setup in-memory SQLite database for testing
-TEST_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(TEST_DATABASE_URL)
-
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
-def drop_db_and_tables():
-    SQLModel.metadata.drop_all(engine)
-
-def get_session_override():
-    with Session(engine) as session:
-        yield session
-
-app.dependency_overrides[get_session] = get_session_override
-
-@pytest.fixture(name="client")
-def client_fixture():
-    drop_db_and_tables()
-    create_db_and_tables()
-    with TestClient(app) as client:
-        yield client
-    drop_db_and_tables()
-
-@pytest.fixture(name="test_user")
-def test_user_fixture(client: TestClient, session: Session):
-    user = User(email="test@example.com", hashed_password=get_password_hash("testpassword"))
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user
+METRICS_HEADERS = {"Authorization": "Bearer test-metrics-token"}
 
 def get_auth_token(client: TestClient, email: str, password: str):
     response = client.post(
@@ -47,8 +21,7 @@ def get_auth_token(client: TestClient, email: str, password: str):
     )
     return response.json()["access_token"]
 
-def test_signup():
-    client = TestClient(app)
+def test_signup(client: TestClient):
     response = client.post(
         "/api/signup",
         json={"email": "newuser@example.com", "password": "newpassword"},
@@ -56,15 +29,13 @@ def test_signup():
     assert response.status_code == 200
     assert response.json() == {"message": "User created successfully"}
 
-def test_signup_existing_email():
-    client = TestClient(app)
+def test_signup_existing_email(client: TestClient):
     client.post("/api/signup", json={"email": "existing@example.com", "password": "password"})
     response = client.post("/api/signup", json={"email": "existing@example.com", "password": "anotherpassword"})
     assert response.status_code == 400
     assert response.json()["detail"] == "Email already registered"
 
-def test_login():
-    client = TestClient(app)
+def test_login(client: TestClient):
     client.post("/api/signup", json={"email": "user@example.com", "password": "password"})
     response = client.post(
         "/api/login",
@@ -74,8 +45,7 @@ def test_login():
     assert response.status_code == 200
     assert "access_token" in response.json()
 
-def test_login_invalid_credentials():
-    client = TestClient(app)
+def test_login_invalid_credentials(client: TestClient):
     response = client.post(
         "/api/login",
         data={"username": "wrong@example.com", "password": "wrongpassword"},
@@ -84,6 +54,93 @@ def test_login_invalid_credentials():
     assert response.status_code == 401
     assert response.json()["detail"] == "Incorrect username or password"
 
+def test_login_lockout_after_repeated_failures(client: TestClient, test_user: User, monkeypatch):
+    from src.lib import rate_limit
+
+    monkeypatch.setattr(rate_limit, "LOGIN_LOCKOUT_THRESHOLD", 2)
+    for _ in range(2):
+        response = client.post("/api/login", data={"username": test_user.email, "password": "wrongpassword"})
+        assert response.status_code == 401
+    # Locked out: even the right password is rejected without being checked
+    response = client.post("/api/login", data={"username": test_user.email, "password": "testpassword"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+def test_signup_rate_limited_per_ip(client: TestClient, monkeypatch):
+    from src.lib import rate_limit
+
+    monkeypatch.setattr(rate_limit, "AUTH_IP_BURST", 1)
+    client.post("/api/signup", json={"email": "first@example.com", "password": "password"})
+    response = client.post("/api/signup", json={"email": "second@example.com", "password": "password"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+def test_password_hashing_runs_in_process_pool(monkeypatch):
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    from src.lib import security
+
+    security.shutdown_hash_executor()
+    monkeypatch.setattr(security, "HASH_WORKERS", 1)
+    try:
+        hashed = asyncio.run(security.get_password_hash_async("secret"))
+        assert isinstance(security.get_hash_executor(), ProcessPoolExecutor)
+        assert asyncio.run(security.verify_and_update_password("secret", hashed)) == (True, None)
+        assert asyncio.run(security.verify_and_update_password("wrong", hashed)) == (False, None)
+    finally:
+        security.shutdown_hash_executor()
+
+def test_hashing_rejects_when_queue_is_full(monkeypatch):
+    import asyncio
+    import threading
+    from fastapi import HTTPException
+    from src.lib import security
+
+    # No process pool: one slot in the threadpool queue, held until released
+    monkeypatch.setattr(security, "HASH_WORKERS", 0)
+    monkeypatch.setattr(security, "HASH_QUEUE_SIZE", 1)
+    release = threading.Event()
+
+    async def scenario():
+        held = asyncio.create_task(security._run_hashing(release.wait, 5))
+        await asyncio.sleep(0.05)
+        rejected = None
+        try:
+            await security.get_password_hash_async("secret")
+        except HTTPException as e:
+            rejected = e
+        release.set()
+        await held
+        # The slot is free again once the held hash finishes
+        return rejected, await security.get_password_hash_async("secret")
+
+    rejected, hashed = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
+    assert security.verify_password("secret", hashed)
+
+def test_login_returns_503_when_hashing_is_saturated(client: TestClient, test_user: User, monkeypatch):
+    from src.lib import security
+
+    monkeypatch.setattr(security, "HASH_QUEUE_SIZE", 1)
+    monkeypatch.setattr(security, "_pending", security.HASH_WORKERS + 1)
+    response = client.post("/api/login", data={"username": test_user.email, "password": "testpassword"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_login_rehashes_password_with_other_cost(client: TestClient, session: Session):
+    from passlib.hash import bcrypt
+    from src.lib.security import BCRYPT_ROUNDS
+
+    user = User(email="legacy@example.com", hashed_password=bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash("legacypassword"))
+    session.add(user)
+    session.commit()
+    assert get_auth_token(client, user.email, "legacypassword")
+    session.refresh(user)
+    assert bcrypt.from_string(user.hashed_password).rounds == BCRYPT_ROUNDS
+    # The upgraded hash still accepts the same password
+    assert get_auth_token(client, user.email, "legacypassword")
+
 def test_create_task(client: TestClient, test_user: User):
     token = get_auth_token(client, test_user.email, "testpassword")
     response = client.post(
@@ -115,6 +172,50 @@ def test_get_tasks(client: TestClient, test_user: User):
     assert len(response.json()) == 2
     assert response.json()[0]["title"] == "Task 1"
 
+def test_dump_tasks_matches_response_model():
+    from typing import List
+    from pydantic import TypeAdapter
+
+    from datetime import datetime, timezone
+
+    # The response model adds "Z" only to aware values; dump_tasks adds it to every timestamp
+    stamp = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    tasks = [
+        Task(id=1, title="Task 1", owner_id=1, created_at=stamp, updated_at=stamp),
+        Task(id=2, title="Task 2", description="Second", completed=True, owner_id=1, created_at=stamp, updated_at=stamp),
+    ]
+    assert json.loads(dump_tasks(tasks)) == json.loads(TypeAdapter(List[Task]).dump_json(tasks))
+
+def test_dump_tasks_formats_naive_and_aware_timestamps_alike():
+    from datetime import datetime, timezone
+
+    stamp = datetime(2026, 1, 2, 3, 4, 5)
+    naive = Task(id=1, title="Task", created_at=stamp, updated_at=stamp)
+    aware = Task(id=1, title="Task", created_at=stamp.replace(tzinfo=timezone.utc), updated_at=stamp.replace(tzinfo=timezone.utc))
+    assert dump_tasks([naive]) == dump_tasks([aware])
+    assert json.loads(dump_tasks([naive]))[0]["updated_at"] == "2026-01-02T03:04:05Z"
+
+def test_task_timestamps_round_trip_as_utc(client: TestClient, test_user: User, session: Session):
+    from datetime import datetime
+
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Call", "due_at": "2026-10-20T12:00:00+02:00"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["due_at"] == "2026-10-20T10:00:00Z"
+    task_id = response.json()["id"]
+
+    # Stored naive, as TIMESTAMP WITHOUT TIME ZONE columns require
+    stored = session.get(Task, task_id)
+    assert stored.due_at == datetime(2026, 10, 20, 10, 0) and stored.updated_at.tzinfo is None
+    response = client.get(f"/api/users/{test_user.id}/tasks/{task_id}", headers=headers)
+    assert response.json()["due_at"] == "2026-10-20T10:00:00Z"
+    assert response.json()["updated_at"].endswith("Z")
+
 def test_get_task_by_id(client: TestClient, test_user: User):
     token = get_auth_token(client, test_user.email, "testpassword")
     create_response = client.post(
@@ -224,3 +325,948 @@ def test_task_ownership_get(client: TestClient, test_user: User):
     )
     assert response.status_code == 403
     assert response.json()["detail"] == "Not authorized to view tasks for this user"
+
+def test_get_tasks_pagination(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    for i in range(3):
+        client.post(
+            f"/api/users/{test_user.id}/tasks",
+            json={"title": f"Task {i}"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks?limit=2",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Task 0", "Task 1"]
+    next_cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks?limit=2&cursor={next_cursor}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Task 2"]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_tasks_without_limit_returns_first_page(client: TestClient, test_user: User):
+    from src.lib.pagination import DEFAULT_PAGE_SIZE
+
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    items = [{"title": f"Task {i}"} for i in range(DEFAULT_PAGE_SIZE + 1)]
+    client.post(f"/api/users/{test_user.id}/tasks:batch/create", json={"items": items}, headers=headers)
+
+    response = client.get(f"/api/users/{test_user.id}/tasks", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == DEFAULT_PAGE_SIZE
+    response = client.get(f"/api/users/{test_user.id}/tasks?cursor={response.headers['X-Next-Cursor']}", headers=headers)
+    assert [task["title"] for task in response.json()] == [f"Task {DEFAULT_PAGE_SIZE}"]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_tasks_completed_filter(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    create_response = client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Done Task"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Open Task"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    client.patch(
+        f"/api/users/{test_user.id}/tasks/{create_response.json()['id']}/complete",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks?completed=true",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Done Task"]
+
+def test_batch_create_complete_and_delete(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/create",
+        json={"items": [{"title": "Batch 1"}, {"title": "Batch 2"}]},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    task_ids = [result["id"] for result in response.json()["results"]]
+    assert [result["task"]["title"] for result in response.json()["results"]] == ["Batch 1", "Batch 2"]
+
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/complete",
+        json={"ids": [task_ids[0], 9999]},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "not_found"]
+
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/clear-completed",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [result["id"] for result in response.json()["results"]] == [task_ids[0]]
+
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/delete",
+        json={"ids": task_ids},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["not_found", "deleted"]
+
+def test_get_tasks_not_modified(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Polled Task"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+    client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Another Task"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()) == 2
+
+def test_task_list_cache_evicts_by_size():
+    from src.lib.etag import RevisionCache
+
+    cache = RevisionCache(maxsize=10, max_bytes=100, max_entry_bytes=60)
+    cache.set("a", b"a" * 40, 40)
+    cache.set("b", b"b" * 40, 40)
+    assert cache.get("a") is not None
+    # Over the byte budget: the least recently used entry goes, whatever the count
+    cache.set("c", b"c" * 40, 40)
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+    assert cache.bytes == 80
+    # A body above the entry limit is served uncached
+    cache.set("d", b"d" * 70, 70)
+    assert cache.get("d") is None and cache.bytes == 80
+
+def test_get_task_changes(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    create_response = client.post(
+        f"/api/users/{test_user.id}/tasks",
+        json={"title": "Synced Task"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    task_id = create_response.json()["id"]
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks/changes?since=0",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [task["id"] for task in response.json()["changes"]] == [task_id]
+    version = response.json()["version"]
+
+    client.delete(
+        f"/api/users/{test_user.id}/tasks/{task_id}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks/changes?since={version}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    changes = response.json()["changes"]
+    assert len(changes) == 1
+    assert changes[0]["id"] == task_id
+    assert changes[0]["deleted"] is True
+    assert response.json()["version"] > version
+
+def test_search_tasks(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    for title in ["Buy milk", "Milkshake recipe", "Call mom"]:
+        client.post(
+            f"/api/users/{test_user.id}/tasks",
+            json={"title": title},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks/search?q=milk",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert sorted(task["title"] for task in response.json()) == ["Buy milk", "Milkshake recipe"]
+
+def test_import_and_export_tasks(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks/import?format=ndjson",
+        content=b'{"title": "Imported 1"}\n{"title": "Imported 2", "completed": true}\n{"description": "no title"}\n',
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.json()["processed"] == 3
+    assert response.json()["imported"] == 2
+    assert response.json()["errors"][0]["line"] == 3
+
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks/export?format=csv",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,title,description,completed,position,due_at,remind_at,reminded,created_at"
+    assert len(lines) == 3
+
+def test_export_import_round_trip(client: TestClient, test_user: User, session: Session):
+    import json
+
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    rows = [
+        {"title": "Plain"},
+        {"title": "Due", "due_at": "2030-01-02T03:04:05Z", "remind_at": "2030-01-02T02:00:00+01:00"},
+        {"title": "Old", "created_at": "2020-05-06T07:08:09Z", "remind_at": "2020-05-07T00:00:00Z", "reminded": True, "completed": True},
+    ]
+    content = "".join(json.dumps(row) + "\n" for row in rows).encode()
+    assert client.post(f"/api/users/{test_user.id}/tasks/import", content=content, headers=headers).json()["imported"] == 3
+    tasks = client.get(f"/api/users/{test_user.id}/tasks", headers=headers).json()
+    # Move the last task first, so order is not the same as id order
+    client.patch(f"/api/users/{test_user.id}/tasks/{tasks[2]['id']}/move", json={"before_id": tasks[0]["id"]}, headers=headers)
+
+    def export(user_id: int, token: str, format: str) -> str:
+        response = client.get(f"/api/users/{user_id}/tasks/export?format={format}", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        return response.text
+
+    def without_ids(text: str):
+        exported = [json.loads(line) for line in text.splitlines()]
+        for row in exported:
+            del row["id"]
+        return sorted(exported, key=lambda row: row["position"])
+
+    original = export(test_user.id, token, "ndjson")
+    exported = without_ids(original)
+    assert [row["title"] for row in exported] == ["Old", "Plain", "Due"]
+    assert exported[0]["created_at"] == "2020-05-06T07:08:09Z"
+    assert exported[0]["reminded"] is True
+    assert exported[2]["due_at"] == "2030-01-02T03:04:05Z"
+    assert exported[2]["remind_at"] == "2030-01-02T01:00:00Z"
+
+    for format, body in (("ndjson", original), ("csv", export(test_user.id, token, "csv"))):
+        other = User(email=f"restore-{format}@example.com", hashed_password=test_user.hashed_password)
+        session.add(other)
+        session.commit()
+        session.refresh(other)
+        other_token = get_auth_token(client, other.email, "testpassword")
+        response = client.post(
+            f"/api/users/{other.id}/tasks/import?format={format}",
+            content=body.encode(),
+            headers={"Authorization": f"Bearer {other_token}"},
+        )
+        assert response.json()["imported"] == 3
+        assert without_ids(export(other.id, other_token, "ndjson")) == exported
+
+def test_metrics(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    client.get(
+        f"/api/users/{test_user.id}/tasks",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+    response = client.get("/api/metrics", headers=METRICS_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # The route's own template, without the prefix it was included under
+    assert 'http_requests_total{method="GET",route="/users/{user_id}/tasks",status="200"}' in response.text
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+
+def test_metrics_disabled_without_token(client: TestClient, monkeypatch):
+    monkeypatch.setattr("src.middleware.jwt.METRICS_TOKEN", None)
+    for path in ("/api/metrics", "/api/metrics/queries", "/api/metrics/pool"):
+        assert client.get(path, headers=METRICS_HEADERS).status_code == 404
+
+def test_migrations_apply_once():
+    from sqlalchemy import inspect
+    from src.migrations import HEAD, ensure_schema, read_version
+
+    migration_engine = create_engine("sqlite://")
+    assert [m.version for m in ensure_schema(migration_engine)][-1] == HEAD
+    assert read_version(migration_engine) == HEAD
+    assert ensure_schema(migration_engine) == []
+    indexes = {index["name"] for index in inspect(migration_engine).get_indexes("task")}
+    assert "ix_task_owner_id_id" in indexes
+
+def create_baseline_schema(path: str):
+    from sqlalchemy import text
+
+    migration_engine = create_engine(f"sqlite:///{path}")
+    with migration_engine.begin() as connection:
+        # What create_all made of the original models
+        connection.execute(text("CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL, PRIMARY KEY (id))"))
+        connection.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+        connection.execute(text(
+            "CREATE TABLE task (id INTEGER NOT NULL, title VARCHAR NOT NULL, description VARCHAR, "
+            "completed BOOLEAN NOT NULL, owner_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id))"
+        ))
+        connection.execute(text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'old@example.com', 'x')"))
+        connection.execute(text("INSERT INTO task (id, title, completed, owner_id) VALUES (1, 'Old', 0, 1), (2, 'Older', 1, 1)"))
+    return migration_engine
+
+def describe_schema(migration_engine):
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(migration_engine)
+    with migration_engine.connect() as connection:
+        sql = dict(connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).all())
+    schema = {}
+    for table in inspector.get_table_names():
+        if table in ("schema_version", "sqlite_sequence"):
+            continue
+        # Column order and server defaults depend on when a column was added, so they are left out
+        schema[table] = {
+            "columns": {column["name"]: (str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)},
+            "primary_key": inspector.get_pk_constraint(table)["constrained_columns"],
+            "foreign_keys": sorted(
+                (tuple(fk["constrained_columns"]), fk["referred_table"], tuple(fk["referred_columns"]))
+                for fk in inspector.get_foreign_keys(table)
+            ),
+            "indexes": sorted((index["name"], tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table)),
+            "autoincrement": "AUTOINCREMENT" in (sql.get(table) or "").upper(),
+        }
+    return schema
+
+def test_fresh_and_upgraded_schemas_match_the_models(tmp_path):
+    from src.migrations import ensure_schema
+
+    fresh = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    ensure_schema(fresh)
+    upgraded = create_baseline_schema(f"{tmp_path}/baseline.db")
+    ensure_schema(upgraded)
+    models = create_engine(f"sqlite:///{tmp_path}/models.db")
+    SQLModel.metadata.create_all(models)
+    try:
+        assert describe_schema(fresh) == describe_schema(upgraded)
+        # Migrations describe their own versions, so this catches a model change without one
+        assert describe_schema(fresh) == describe_schema(models)
+    finally:
+        for migration_engine in (fresh, upgraded, models):
+            migration_engine.dispose()
+
+def test_migrations_upgrade_baseline_schema(tmp_path):
+    from sqlalchemy import inspect, text
+    from src.migrations import HEAD, ensure_schema, read_version
+
+    migration_engine = create_baseline_schema(f"{tmp_path}/baseline.db")
+    ensure_schema(migration_engine)
+    assert read_version(migration_engine) == HEAD
+    inspector = inspect(migration_engine)
+    assert {"position", "remind_at", "reminded"} <= {column["name"] for column in inspector.get_columns("task")}
+    assert {"ix_task_owner_id_position", "ix_task_reminded_remind_at"} <= {index["name"] for index in inspector.get_indexes("task")}
+    with migration_engine.connect() as connection:
+        positions = connection.execute(text("SELECT position FROM task ORDER BY id")).scalars().all()
+    assert positions == sorted(positions) and None not in positions
+    # Ids of deleted (archived) rows are not handed out again
+    with migration_engine.begin() as connection:
+        connection.execute(text("DELETE FROM task WHERE id = 2"))
+        connection.execute(text("INSERT INTO task (title, completed, owner_id, version, deleted, created_at, updated_at, reminded) "
+                                "VALUES ('New', 0, 1, 0, 0, '2024-01-01', '2024-01-01', 0)"))
+        assert connection.execute(text("SELECT MAX(id) FROM task")).scalar_one() == 3
+
+def test_full_sync_after_upgrading_baseline_schema(tmp_path):
+    import asyncio
+    from src.migrations import ensure_schema
+    from src.services.task_service import TaskService
+
+    ensure_schema(create_baseline_schema(f"{tmp_path}/baseline.db"))
+    sync_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/baseline.db")
+    sync_session_maker = async_sessionmaker(sync_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def scenario():
+        async with sync_session_maker() as session:
+            service = TaskService(session, session)
+            full = await service.get_changes(1, 0)
+            task = await service.create_task("New", None, 1)
+            delta = await service.get_changes(1, full[1])
+        await sync_engine.dispose()
+        return full, task, delta
+
+    (changes, version, has_more), task, (delta, _, _) = asyncio.run(scenario())
+    # Rows from before delta sync are part of a full sync, and later writes come after them
+    assert [row.title for row in changes] == ["Old", "Older"]
+    assert version >= 1 and all(1 <= row.version <= version for row in changes) and not has_more
+    assert task.version > version
+    assert [row.title for row in delta] == ["New"]
+
+def test_replica_routing_skips_unhealthy_replicas(tmp_path):
+    import asyncio
+    from src.lib.replicas import RecentWriters, ReplicaSet
+
+    healthy = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    replicas = ReplicaSet([healthy, broken])
+    asyncio.run(replicas.check())
+    assert [replicas.pick() for _ in range(3)] == [healthy] * 3
+
+    writers = RecentWriters(window=60)
+    writers.mark(1)
+    assert writers.is_recent(1)
+    assert not writers.is_recent(2)
+
+def test_normalize_statement():
+    from src.lib.query_profiler import normalize_statement
+
+    assert normalize_statement("SELECT *\n  FROM task WHERE id IN (?, ?, ?) AND title = 'it''s' LIMIT 20") == (
+        "SELECT * FROM task WHERE id IN (?, ...) AND title = ? LIMIT ?"
+    )
+    assert normalize_statement("INSERT INTO task (a, b) VALUES (%(a_0)s, %(b_0)s), (%(a_1)s, %(b_1)s)") == (
+        "INSERT INTO task (a, b) VALUES (?, ...), ..."
+    )
+    assert normalize_statement("SELECT * FROM task WHERE owner_id = $1 AND due_at < :due_at") == (
+        "SELECT * FROM task WHERE owner_id = ? AND due_at < ?"
+    )
+
+def test_slow_query_log_includes_plan(monkeypatch):
+    import logging
+    from sqlalchemy import text
+    from src.lib import query_profiler
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    # Every statement counts as slow
+    monkeypatch.setattr(query_profiler, "SLOW_QUERY_MS", 0)
+    profiled_engine = create_engine("sqlite://")
+    query_profiler.install_query_profiler(profiled_engine)
+    capture = Capture()
+    query_profiler.stop_query_log()
+    query_profiler.start_query_log(capture)
+    try:
+        with profiled_engine.begin() as connection:
+            connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name VARCHAR)"))
+            connection.execute(text("CREATE INDEX ix_item_name ON item (name)"))
+            connection.execute(text("SELECT id FROM item WHERE name = :name"), {"name": "secret"})
+    finally:
+        # Stopping the listener drains the queue into the handler
+        query_profiler.stop_query_log()
+        query_profiler.start_query_log()
+    messages = [record.getMessage() for record in capture.records]
+    select_message = next(message for message in messages if "FROM item" in message)
+    assert select_message.startswith("slow query ")
+    assert "SELECT id FROM item WHERE name = ?" in select_message
+    assert "plan:" in select_message and "ix_item_name" in select_message
+    # Parameters stay out of the log unless SLOW_QUERY_LOG_PARAMS is set
+    assert "secret" not in select_message
+    # DDL is logged but not explained
+    assert all("plan:" not in message for message in messages if "CREATE" in message)
+    assert any(row["statement"] == "SELECT id FROM item WHERE name = ?" for row in query_profiler.query_stats.top(1000))
+
+def test_pool_report(client: TestClient):
+    response = client.get("/api/metrics/pool", headers=METRICS_HEADERS)
+    assert response.status_code == 200
+    assert "primary" in response.json()
+    assert response.json()["primary"]["checkouts"] > 0
+    assert "exhausted_seconds_total" in response.json()["primary"]
+
+def test_pool_exhaustion_is_timed(tmp_path):
+    import time
+    from src.lib.metrics import instrument_engine, pool_stats
+
+    pool_engine = create_engine(f"sqlite:///{tmp_path}/pool.db", pool_size=1, max_overflow=0)
+    instrument_engine(pool_engine, "exhaustion-test", max_overflow=0)
+    with pool_engine.connect():
+        time.sleep(0.05)
+    with pool_engine.connect():
+        pass
+    stats = pool_stats()["exhaustion-test"]
+    pool_engine.dispose()
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 1
+    assert stats["exhausted_seconds_total"] >= 0.05
+    assert stats["size"] == 1
+
+def test_task_events_websocket(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    with client.websocket_connect(f"/api/users/{test_user.id}/tasks/events?token={token}") as websocket:
+        assert websocket.receive_json() == {"type": "ready"}
+        create_response = client.post(
+            f"/api/users/{test_user.id}/tasks",
+            json={"title": "Pushed Task"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        event = websocket.receive_json()
+        assert event["type"] == "changes"
+        assert [task["id"] for task in event["changes"]] == [create_response.json()["id"]]
+        assert event["version"] == create_response.json()["version"]
+
+def test_task_events_drop_slow_consumers():
+    import asyncio
+    from src.lib.events import STALE, TaskEventBus
+
+    async def scenario():
+        bus = TaskEventBus(queue_size=3)
+        subscription = bus.subscribe(1)
+        other = bus.subscribe(2)
+        for version in range(1, 5):
+            await bus.publish(1, version, [])
+        return [message async for message in subscription.messages(heartbeat=0.01)], bus.stats(), other.dropped
+
+    messages, stats, other_dropped = asyncio.run(scenario())
+    assert messages == [STALE]
+    assert stats["dropped"] == 1
+    assert stats["subscribers"] == 1
+    assert not other_dropped
+
+def test_task_stats(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/create",
+        json={"items": [{"title": "Stat 1"}, {"title": "Stat 2"}, {"title": "Stat 3", "completed": True}]},
+        headers=headers,
+    )
+    task_ids = [result["id"] for result in response.json()["results"]]
+    client.patch(f"/api/users/{test_user.id}/tasks/{task_ids[0]}/complete", headers=headers)
+    client.put(f"/api/users/{test_user.id}/tasks/{task_ids[2]}", json={"completed": True}, headers=headers)
+    client.delete(f"/api/users/{test_user.id}/tasks/{task_ids[1]}", headers=headers)
+
+    response = client.get(f"/api/users/{test_user.id}/tasks/stats", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"total": 2, "completed": 2, "pending": 0, "created_last_7_days": 2}
+
+def test_refresh_token_rotation_and_reuse(client: TestClient, test_user: User):
+    response = client.post("/api/login", data={"username": test_user.email, "password": "testpassword"})
+    first = response.json()["refresh_token"]
+
+    response = client.post("/api/token/refresh", json={"refresh_token": first})
+    assert response.status_code == 200
+    second = response.json()["refresh_token"]
+    assert second != first
+    response = client.get(
+        f"/api/users/{test_user.id}/tasks",
+        headers={"Authorization": f"Bearer {response.json()['access_token']}"},
+    )
+    assert response.status_code == 200
+
+    # Replaying a used token revokes every token rotated from the same login
+    assert client.post("/api/token/refresh", json={"refresh_token": first}).status_code == 401
+    assert client.post("/api/token/refresh", json={"refresh_token": second}).status_code == 401
+
+def test_revoke_all_sessions(client: TestClient, test_user: User):
+    response = client.post("/api/login", data={"username": test_user.email, "password": "testpassword"})
+    tokens = response.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.post("/api/token/revoke-all", headers=headers)
+    assert response.status_code == 204
+    assert client.post("/api/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # The access token is revoked too, while a fresh login works
+    assert client.get(f"/api/users/{test_user.id}/tasks", headers=headers).status_code == 401
+    token = get_auth_token(client, test_user.email, "testpassword")
+    assert client.get(f"/api/users/{test_user.id}/tasks", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+def test_principal_cache_hits_expiry_and_eviction(monkeypatch):
+    from src.lib import principal_cache as module
+    from src.lib.principal_cache import PrincipalCache
+
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "time", lambda: now[0])
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1, "alice")
+    assert cache.get("a") == "alice"
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+    # An entry lives for the TTL, and never past its token's own expiry
+    cache.set("b", 2, "bob", token_expires_at=now[0] + 10)
+    now[0] += 10
+    assert cache.get("b") is None
+    assert cache.get("a") == "alice"
+    now[0] += 50
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+    # Least recently used goes first
+    cache.set("a", 1, "alice")
+    cache.set("b", 2, "bob")
+    cache.get("a")
+    cache.set("c", 3, "carol")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("alice", "carol")
+
+    # Invalidation drops every token of that user and only those
+    cache.set("a2", 1, "alice")
+    cache.invalidate_user(1)
+    assert cache.get("a") is None and cache.get("a2") is None
+    assert cache.get("c") == "carol"
+
+def test_principal_cache_invalidated_on_revoke_all_and_password_change(client: TestClient, test_user: User, session: Session):
+    from src.lib.principal_cache import principal_cache
+    from src.lib.security import get_password_hash
+
+    principal_cache.clear()
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get(f"/api/users/{test_user.id}/tasks", headers=headers).status_code == 200
+    assert principal_cache.get(token) is not None
+
+    # A password change drops cached principals; the token itself stays valid and is checked again
+    user = session.get(User, test_user.id)
+    user.hashed_password = get_password_hash("newpassword")
+    session.add(user)
+    session.commit()
+    assert principal_cache.get(token) is None
+    assert client.get(f"/api/users/{test_user.id}/tasks", headers=headers).status_code == 200
+    assert principal_cache.get(token).hashed_password == user.hashed_password
+
+    # Revoke-all authenticates through the cache, then must evict the token it was called with
+    assert client.post("/api/token/revoke-all", headers=headers).status_code == 204
+    assert principal_cache.get(token) is None
+    assert client.get(f"/api/users/{test_user.id}/tasks", headers=headers).status_code == 401
+
+def test_group_commit_isolates_failed_writes(tmp_path):
+    import asyncio
+    from sqlalchemy import text
+    from sqlalchemy.exc import IntegrityError
+    from src.lib.group_commit import GroupCommitter
+
+    group_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/group.db")
+    group_session_maker = async_sessionmaker(group_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def insert(item_id: int):
+        async def operation(session):
+            await session.execute(text("INSERT INTO item (id) VALUES (:id)"), {"id": item_id})
+            return item_id
+        return operation
+
+    async def scenario():
+        async with group_engine.begin() as connection:
+            await connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY)"))
+        committer = GroupCommitter(group_session_maker, window=0.05, max_ops=10)
+        await committer.start()
+        results = await asyncio.gather(
+            committer.submit(insert(1)), committer.submit(insert(1)), committer.submit(insert(2)),
+            return_exceptions=True,
+        )
+        await committer.stop()
+        async with group_session_maker() as session:
+            stored = (await session.execute(text("SELECT id FROM item ORDER BY id"))).scalars().all()
+        await group_engine.dispose()
+        return results, stored
+
+    results, stored = asyncio.run(scenario())
+    assert results[0] == 1 and results[2] == 2
+    assert isinstance(results[1], IntegrityError)
+    assert stored == [1, 2]
+
+def test_group_commit_batch_size_skips_cancelled_writes(tmp_path):
+    import asyncio
+    from src.lib.group_commit import GroupCommitter
+    from src.lib.metrics import registry
+
+    group_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/group.db")
+    group_session_maker = async_sessionmaker(group_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def batch_size_sum() -> float:
+        lines = [line for line in registry.render().splitlines() if line.startswith("task_group_commit_batch_size_sum")]
+        return float(lines[0].split()[-1]) if lines else 0.0
+
+    async def operation(session):
+        return True
+
+    async def scenario():
+        committer = GroupCommitter(group_session_maker, window=0.05, max_ops=10)
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(3)]
+        futures[1].cancel()
+        await committer._commit([(0, operation, future) for future in futures])
+        await group_engine.dispose()
+        return futures
+
+    before = batch_size_sum()
+    futures = asyncio.run(scenario())
+    assert futures[0].result() and futures[2].result()
+    assert batch_size_sum() - before == 2
+
+def test_group_commit_runs_task_service_writes(tmp_path, monkeypatch):
+    import asyncio
+    from fastapi import HTTPException
+    from src.lib.group_commit import GroupCommitter
+    from src.services import task_service as task_service_module
+    from src.services.task_service import TaskService
+
+    group_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/group.db")
+    group_session_maker = async_sessionmaker(group_engine, class_=AsyncSession, expire_on_commit=False)
+    committer = GroupCommitter(group_session_maker, window=0.05, max_ops=10)
+    monkeypatch.setattr(task_service_module, "task_writes", committer)
+
+    async def scenario():
+        async with group_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+        async with group_session_maker() as session:
+            users = [User(email=f"group{n}@example.com", hashed_password="unused") for n in range(2)]
+            session.add_all(users)
+            await session.commit()
+            first, second = (user.id for user in users)
+        await committer.start()
+        async with group_session_maker() as session:
+            service = TaskService(session, session)
+            # Submitted in descending owner order; one batch runs them by owner
+            created = await asyncio.gather(
+                service.create_task("B1", None, second),
+                service.create_task("A1", None, first),
+                service.create_task("B2", None, second),
+            )
+            toggled, missing = await asyncio.gather(
+                service.toggle_task_completion(created[1].id, first),
+                service.delete_task(created[1].id, second),
+                return_exceptions=True,
+            )
+            await service.delete_task(created[0].id, second)
+        await committer.stop()
+        async with group_session_maker() as session:
+            revisions = {row.owner_id: row.revision for row in (await session.exec(select(TaskRevision))).all()}
+            tasks = {task.title: task for task in (await session.exec(select(Task))).all()}
+        await group_engine.dispose()
+        return first, second, created, toggled, missing, revisions, tasks
+
+    first, second, created, toggled, missing, revisions, tasks = asyncio.run(scenario())
+    assert [task.title for task in created] == ["B1", "A1", "B2"]
+    assert toggled.completed is True and toggled.version == 2
+    # Another owner's delete fails alone, without undoing the toggle batched with it
+    assert isinstance(missing, HTTPException) and missing.status_code == 404
+    assert revisions == {first: 2, second: 3}
+    assert tasks["A1"].completed is True
+    assert tasks["B1"].deleted is True and tasks["B1"].version == 3
+    assert tasks["B2"].version == 2
+
+def test_archived_tasks_fall_through(client: TestClient, test_user: User, session: Session):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post(f"/api/users/{test_user.id}/tasks", json={"title": "Open Task"}, headers=headers)
+    session.add(ArchivedTask(id=1000, title="Old Task", owner_id=test_user.id))
+    session.commit()
+
+    response = client.get(f"/api/users/{test_user.id}/tasks", headers=headers)
+    assert [task["title"] for task in response.json()] == ["Open Task"]
+    response = client.get(f"/api/users/{test_user.id}/tasks?include_archived=true", headers=headers)
+    assert [task["title"] for task in response.json()] == ["Open Task", "Old Task"]
+
+    response = client.get(f"/api/users/{test_user.id}/tasks/1000", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Old Task"
+
+    # Reopening an archived task moves it back into the working set
+    response = client.patch(f"/api/users/{test_user.id}/tasks/1000/complete", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["completed"] is False
+    response = client.get(f"/api/users/{test_user.id}/tasks", headers=headers)
+    assert [task["title"] for task in response.json()] == ["Open Task", "Old Task"]
+    session.expire_all()
+    assert session.get(ArchivedTask, 1000) is None
+
+def test_batch_writes_reach_archived_tasks(client: TestClient, test_user: User, session: Session):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    session.add_all([
+        ArchivedTask(id=1000, title="Old Task", owner_id=test_user.id, completed=True),
+        ArchivedTask(id=1001, title="Older Task", owner_id=test_user.id, completed=True),
+        ArchivedTask(id=1002, title="Oldest Task", owner_id=test_user.id, completed=True),
+    ])
+    session.commit()
+
+    # An item without changes finds the archived task without moving it
+    response = client.post(
+        f"/api/users/{test_user.id}/tasks:batch/update",
+        json={"items": [{"id": 1000, "title": "Renamed"}, {"id": 1002}, {"id": 9999, "title": "Missing"}]},
+        headers=headers,
+    )
+    assert [result["status"] for result in response.json()["results"]] == ["updated", "updated", "not_found"]
+    assert response.json()["results"][0]["task"]["title"] == "Renamed"
+    assert response.json()["results"][1]["task"]["title"] == "Oldest Task"
+
+    response = client.post(f"/api/users/{test_user.id}/tasks:batch/complete", json={"ids": [1002], "completed": False}, headers=headers)
+    assert response.json()["results"][0]["status"] == "updated"
+    assert response.json()["results"][0]["task"]["completed"] is False
+
+    response = client.post(f"/api/users/{test_user.id}/tasks:batch/delete", json={"ids": [1001]}, headers=headers)
+    assert [result["status"] for result in response.json()["results"]] == ["deleted"]
+
+    response = client.get(f"/api/users/{test_user.id}/tasks", headers=headers)
+    assert [task["title"] for task in response.json()] == ["Renamed", "Oldest Task"]
+    session.expire_all()
+    assert session.exec(select(ArchivedTask)).all() == []
+
+def test_move_task_rewrites_only_its_position(client: TestClient, test_user: User):
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    created = [
+        client.post(f"/api/users/{test_user.id}/tasks", json={"title": title}, headers=headers).json()
+        for title in ("First", "Second", "Third")
+    ]
+    first, second, third = created
+
+    response = client.patch(f"/api/users/{test_user.id}/tasks/{third['id']}/move", json={"after_id": first["id"]}, headers=headers)
+    assert response.status_code == 200
+    assert first["position"] < response.json()["position"] < second["position"]
+
+    response = client.get(f"/api/users/{test_user.id}/tasks?sort=position", headers=headers)
+    assert [task["title"] for task in response.json()] == ["First", "Third", "Second"]
+    # The neighbours kept their keys and versions
+    unchanged = {task["id"]: task for task in response.json()}
+    assert unchanged[first["id"]] == first and unchanged[second["id"]] == second
+
+    response = client.patch(f"/api/users/{test_user.id}/tasks/{first['id']}/move", json={"before_id": first["id"]}, headers=headers)
+    assert response.status_code == 400
+    response = client.patch(
+        f"/api/users/{test_user.id}/tasks/{first['id']}/move",
+        json={"after_id": second["id"], "before_id": third["id"]},
+        headers=headers,
+    )
+    assert response.status_code == 409
+
+def test_rebalance_rewrites_positions_as_a_write(client: TestClient, test_user: User, monkeypatch):
+    import asyncio
+    from src.jobs import positions
+
+    token = get_auth_token(client, test_user.email, "testpassword")
+    headers = {"Authorization": f"Bearer {token}"}
+    created = [
+        client.post(f"/api/users/{test_user.id}/tasks", json={"title": title}, headers=headers).json()
+        for title in ("First", "Second", "Third")
+    ]
+    client.patch(f"/api/users/{test_user.id}/tasks/{created[2]['id']}/move", json={"after_id": created[0]["id"]}, headers=headers)
+
+    rebalance_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+    monkeypatch.setattr(positions, "async_session_maker", async_sessionmaker(rebalance_engine, class_=AsyncSession, expire_on_commit=False))
+
+    async def scenario():
+        try:
+            return await positions.rebalance_owner_positions(test_user.id, max_length=1)
+        finally:
+            await rebalance_engine.dispose()
+
+    assert asyncio.run(scenario()) == 3
+    tasks = client.get(f"/api/users/{test_user.id}/tasks?sort=position", headers=headers).json()
+    assert [task["title"] for task in tasks] == ["First", "Third", "Second"]
+    # Every rewritten task carries the new version and a new updated_at, like any other write
+    for task, before in zip(sorted(tasks, key=lambda task: task["id"]), created):
+        assert task["version"] > before["version"]
+        assert task["updated_at"] > before["updated_at"]
+
+def test_reminder_scheduler_fires_due_reminders(tmp_path):
+    import asyncio
+    from datetime import timedelta
+    from src.lib.clock import utcnow
+    from src.lib.events import task_events
+    from src.lib.reminders import ReminderNotifier, ReminderScheduler
+    from src.lib.serialization import dump_json
+
+    reminder_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/reminders.db")
+    reminder_session_maker = async_sessionmaker(reminder_engine, class_=AsyncSession, expire_on_commit=False)
+
+    class RecordingNotifier(ReminderNotifier):
+        def __init__(self):
+            self.sent = []
+
+        async def notify(self, task):
+            self.sent.append(task.id)
+
+    async def scenario():
+        async with reminder_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+        now = utcnow()
+        async with reminder_session_maker() as session:
+            user = User(email="reminders@example.com", hashed_password="unused")
+            session.add(user)
+            await session.commit()
+            session.add_all([
+                TaskRevision(owner_id=user.id, revision=1),
+                Task(id=1, title="Due", owner_id=user.id, remind_at=now - timedelta(seconds=1), updated_at=now - timedelta(days=1)),
+                Task(id=2, title="Tomorrow", owner_id=user.id, remind_at=now + timedelta(days=1)),
+                Task(id=3, title="Done", owner_id=user.id, remind_at=now, completed=True),
+            ])
+            await session.commit()
+
+        notifier = RecordingNotifier()
+        scheduler = ReminderScheduler(window=60)
+        await scheduler.start(reminder_engine, reminder_session_maker, notifier)
+        await asyncio.sleep(0.2)
+        assert notifier.sent == [1]
+        # The claim is a write: it bumps the owner's revision and the task's version
+        async with reminder_session_maker() as session:
+            assert (await session.get(TaskRevision, user.id)).revision == 2
+            claimed = await session.get(Task, 1)
+            assert claimed.version == 2
+            assert claimed.updated_at >= now
+
+        # A write moving a reminder into the window reaches the heap through its task event
+        async with reminder_session_maker() as session:
+            task = await session.get(Task, 2)
+            task.remind_at = utcnow() + timedelta(seconds=0.2)
+            await session.commit()
+        task_events.deliver(user.id, dump_json({"type": "changes", "version": 1, "changes": [task]}))
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+        async with reminder_session_maker() as session:
+            reminded = (await session.get(Task, 2)).reminded
+        await reminder_engine.dispose()
+        return notifier.sent, reminded
+
+    sent, reminded = asyncio.run(scenario())
+    assert sent == [1, 2]
+    assert reminded is True
+
+def test_reminder_scheduler_keeps_events_during_load(tmp_path):
+    import asyncio
+    from contextlib import asynccontextmanager
+    from datetime import timedelta
+    from src.lib.clock import utcnow
+    from src.lib.reminders import ReminderScheduler
+    from src.lib.serialization import dump_json
+
+    reminder_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/reminders.db")
+    reminder_session_maker = async_sessionmaker(reminder_engine, class_=AsyncSession, expire_on_commit=False)
+    scheduler = ReminderScheduler(window=60)
+    moved = Task(id=1, title="Moved", owner_id=1, remind_at=utcnow() + timedelta(seconds=30))
+
+    @asynccontextmanager
+    async def session_factory():
+        # The write lands after the load started reading, and its event arrives before the load ends
+        scheduler._on_event(1, dump_json({"type": "changes", "version": 2, "changes": [moved]}))
+        async with reminder_session_maker() as session:
+            yield session
+
+    async def scenario():
+        async with reminder_engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+        scheduler.leader = True
+        scheduler._session_factory = session_factory
+        await scheduler._load()
+        await reminder_engine.dispose()
+
+    asyncio.run(scenario())
+    assert scheduler._scheduled == {1: moved.remind_at}